@@ -101,13 +101,28 @@ class App extends Component {
   }
 
 
-  async getProducts(){
-    let response = await fetch('/api/products/', {
-      headers: {
-        'Accept': 'application/json',
-        'Content-Type': 'application/json',
+  catalogSnapshot(){
+    // Ссылки на статические снимки каталога, если Django положил их в страницу
+    let element = document.getElementById('catalog-snapshot');
+    return element ? JSON.parse(element.textContent) : {};
+  }
+
+  async fetchCatalog(snapshotUrl, apiUrl){
+    let headers = {
+      'Accept': 'application/json',
+      'Content-Type': 'application/json',
+    };
+    if (snapshotUrl){
+      let response = await fetch(snapshotUrl, {headers});
+      if (response.ok){
+        return response;
       }
-    });
+    }
+    return await fetch(apiUrl, {headers});
+  }
+
+  async getProducts(){
+    let response = await this.fetchCatalog(this.catalogSnapshot().products, '/api/products/');
 
     if (!response.ok){
       return;
@@ -120,12 +135,7 @@ class App extends Component {
   }
 
   async getBanners(){
-    let response = await fetch('/api/banners/', {
-      headers: {
-        'Accept': 'application/json',
-        'Content-Type': 'application/json',
-      }
-    });
+    let response = await this.fetchCatalog(this.catalogSnapshot().banners, '/api/banners/');
 
     if (!response.ok){
       return;
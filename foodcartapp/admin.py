@@ -1,10 +1,14 @@
-from django.contrib import admin
-from django.db.models import Count
+from django.contrib import admin, messages
 from django.shortcuts import reverse, redirect
 from django.templatetags.static import static
 from django.utils.html import format_html
+from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from locations.geodata import fetch_coordinates
+
+from .capabilities import ProductCapabilityIndex
+from .geocoding import schedule_order_geocoding
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
@@ -32,6 +36,20 @@ class RestaurantAdmin(admin.ModelAdmin):
     inlines = [
         RestaurantMenuItemInline
     ]
+    readonly_fields = [
+        'lon',
+        'lat',
+        'geocoded_at',
+    ]
+
+    def save_model(self, request, obj, form, change):
+        if 'address' in form.changed_data:
+            coords = fetch_coordinates(obj.address)
+            obj.lon, obj.lat = coords or (None, None)
+            obj.geocoded_at = timezone.now() if coords else None
+            if coords is None:
+                messages.warning(request, f'Не удалось определить координаты адреса «{obj.address}»')
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(Product)
@@ -119,10 +137,11 @@ class OrderItemsInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'status', 'firstname', 'lastname', 
-        'phonenumber', 'address', 'items_count', 
+        'phonenumber', 'address', 'items_count', 'total_cost',
         'payment_method', 'comment', 'cooking_restaurant'
     )
     search_fields = ('id', 'firstname', 'lastname', 'phonenumber', 'address')
+    readonly_fields = ('total_cost', 'geocode_status')
     inlines = [OrderItemsInline]
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
@@ -130,28 +149,15 @@ class OrderAdmin(admin.ModelAdmin):
             order_id = request.resolver_match.kwargs.get('object_id')
 
             if order_id is not None:
-                from .models import OrderItems, Restaurant
-
                 product_ids = list(
                     OrderItems.objects.filter(order_id=order_id)
                     .values_list('product_id', flat=True)
                 )
 
                 if product_ids:
-                    needed_count = len(set(product_ids))
-                    qs = (
-                        Restaurant.objects
-                        .filter(
-                            menu_items__availability=True,
-                            menu_items__product_id__in=product_ids,
-                        )
-                        .annotate(
-                            matched_products=Count(
-                                'menu_items__product_id',
-                                distinct=True,
-                            )
-                        )
-                        .filter(matched_products=needed_count)
+                    capabilities = ProductCapabilityIndex.build()
+                    qs = Restaurant.objects.filter(
+                        pk__in=capabilities.restaurants_for(product_ids)
                     )
                 else:
                     qs = Restaurant.objects.none()
@@ -163,7 +169,13 @@ class OrderAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if obj.cooking_restaurant and obj.status == Order.STATUS_NEW:
             obj.status = Order.STATUS_ASSEMBLING
+        address_changed = 'address' in form.changed_data
+        if address_changed:
+            obj.lon = obj.lat = None
+            obj.geocode_status = Order.GEOCODE_PENDING
         super().save_model(request, obj, form, change)
+        if address_changed:
+            schedule_order_geocoding([obj.pk])
 
     def response_change(self, request, obj):
         next_url = request.GET.get('next')
@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from locations.distances import paired_distances
+from locations.spatial import SpatialIndex
+
+from .capabilities import ProductCapabilityIndex
+from .models import Order, OrderCandidate, OrderItems, Restaurant
+
+# Пересчёт идёт в фоне и по частям: сохранение ресторана в админке затрагивает
+# все незавершённые заказы, и ждать их пересчёта в запросе незачем
+REFRESH_BATCH_SIZE = 500
+
+_pending = threading.local()
+_executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='order-candidates',
+)
+
+
+def refresh_order_candidates(order_ids):
+    order_ids = sorted(set(order_ids))
+    if not order_ids:
+        return
+
+    restaurants = list(Restaurant.objects.all())
+    capabilities = ProductCapabilityIndex.build()
+    restaurants_index = SpatialIndex(
+        restaurants,
+        [restaurant.coords for restaurant in restaurants],
+    )
+    for start in range(0, len(order_ids), REFRESH_BATCH_SIZE):
+        _refresh_candidates_batch(
+            order_ids[start:start + REFRESH_BATCH_SIZE],
+            restaurants_index,
+            capabilities,
+        )
+
+
+def _refresh_candidates_batch(order_ids, restaurants_index, capabilities):
+    orders = list(
+        Order.objects
+        .not_finished()
+        .filter(pk__in=order_ids)
+        .prefetch_related(
+            Prefetch('items', queryset=OrderItems.objects.only('order_id', 'product_id'))
+        )
+    )
+
+    pairs = []
+    for order in orders:
+        order_coords = order.coords
+        basket_mask = capabilities.basket_mask(
+            item.product_id for item in order.items.all()
+        )
+        nearest = restaurants_index.nearest(
+            order_coords,
+            k=settings.ORDER_CANDIDATES_LIMIT,
+            predicate=lambda restaurant: capabilities.can_cook(restaurant.id, basket_mask),
+        )
+        for restaurant, _ in nearest:
+            pairs.append((order, order_coords, restaurant))
+
+    distances = paired_distances(
+        [order_coords for _, order_coords, _ in pairs],
+        [restaurant.coords for _, _, restaurant in pairs],
+        metric=settings.DISTANCE_METRIC,
+    )
+
+    with transaction.atomic():
+        OrderCandidate.objects.filter(order_id__in=order_ids).delete()
+        OrderCandidate.objects.bulk_create([
+            OrderCandidate(order=order, restaurant=restaurant, distance=float(dist))
+            for (order, _, restaurant), dist in zip(pairs, distances)
+        ])
+        Order.objects.filter(pk__in=order_ids).update(updated_at=timezone.now())
+
+
+def refresh_all_candidates():
+    OrderCandidate.objects.exclude(
+        order__in=Order.objects.not_finished()
+    ).delete()
+    refresh_order_candidates(
+        Order.objects.not_finished().values_list('pk', flat=True)
+    )
+
+
+def schedule_candidates_refresh(order_ids):
+    pending = getattr(_pending, 'order_ids', None)
+    if pending is None:
+        pending = _pending.order_ids = set()
+    pending.update(order_ids)
+    transaction.on_commit(_flush_candidates_refresh)
+
+
+def _flush_candidates_refresh():
+    order_ids = getattr(_pending, 'order_ids', None)
+    _pending.order_ids = None
+    if order_ids:
+        _executor.submit(_refresh_candidates_job, order_ids)
+
+
+def _refresh_candidates_job(order_ids):
+    try:
+        refresh_order_candidates(order_ids)
+    finally:
+        connections.close_all()
@@ -0,0 +1,47 @@
+from .models import RestaurantMenuItem
+
+
+class ProductCapabilityIndex:
+    """Какие рестораны могут приготовить набор товаров.
+
+    Каждому товару из доступного меню выдаётся свой бит, меню ресторана
+    хранится как битовая маска. Проверка корзины — одно AND и сравнение.
+    """
+
+    def __init__(self, menu_items):
+        self.product_bits = {}
+        self.restaurant_masks = {}
+        for restaurant_id, product_id in menu_items:
+            bit = self.product_bits.setdefault(product_id, len(self.product_bits))
+            mask = self.restaurant_masks.get(restaurant_id, 0)
+            self.restaurant_masks[restaurant_id] = mask | (1 << bit)
+
+    @classmethod
+    def build(cls):
+        menu_items = (
+            RestaurantMenuItem.objects
+            .filter(availability=True)
+            .values_list('restaurant_id', 'product_id')
+        )
+        return cls(menu_items)
+
+    def basket_mask(self, product_ids):
+        mask = 0
+        for product_id in product_ids:
+            bit = self.product_bits.get(product_id)
+            if bit is None:
+                return None
+            mask |= 1 << bit
+        return mask
+
+    def can_cook(self, restaurant_id, basket_mask) -> bool:
+        if basket_mask is None:
+            return False
+        return self.restaurant_masks.get(restaurant_id, 0) & basket_mask == basket_mask
+
+    def restaurants_for(self, product_ids) -> list:
+        basket_mask = self.basket_mask(product_ids)
+        return [
+            restaurant_id for restaurant_id in self.restaurant_masks
+            if self.can_cook(restaurant_id, basket_mask)
+        ]
@@ -0,0 +1,208 @@
+import gzip
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.templatetags.static import static
+from rest_framework.renderers import JSONRenderer
+
+from locations.cache import LRUCache
+from star_burger.cursors import InvalidCursor, decode_cursor, encode_cursor
+
+from .generations import get_generation
+from .models import Product
+
+CATALOG_GENERATION = 'catalog'
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+# Сколько вариантов списка товаров держать в памяти процесса
+CATALOG_LOCAL_CACHE_SIZE = 64
+
+
+_local = {}
+_local_lock = threading.Lock()
+_documents = LRUCache(maxsize=CATALOG_LOCAL_CACHE_SIZE, ttl=CATALOG_CACHE_TIMEOUT)
+
+
+class PreencodedJSON:
+    """Готовый JSON-ответ: тело в байтах и его сжатая копия."""
+
+    def __init__(self, body, last_modified):
+        self.body = body
+        self.last_modified = last_modified
+        self.etag = '"{}"'.format(hashlib.sha256(body).hexdigest())
+        self.gzip_etag = '"{}-gzip"'.format(self.etag.strip('"'))
+        self.gzipped = gzip.compress(body, mtime=0) if settings.CATALOG_GZIP else None
+
+
+def dump_banners():
+    return [
+        {
+            'title': 'Burger',
+            'src': static('burger.jpg'),
+            'text': 'Tasty Burger at your door step',
+        },
+        {
+            'title': 'Spices',
+            'src': static('food.jpg'),
+            'text': 'All Cuisines',
+        },
+        {
+            'title': 'New York',
+            'src': static('tasty.jpg'),
+            'text': 'Food is incomplete without a tasty dessert',
+        }
+    ]
+
+
+# Поле ответа API: колонки, которые для него нужны, и как его получить из товара
+PRODUCT_FIELDS = {
+    'id': (['id'], lambda product: product.id),
+    'name': (['name'], lambda product: product.name),
+    'price': (['price'], lambda product: product.price),
+    'special_status': (['special_status'], lambda product: product.special_status),
+    'description': (['description'], lambda product: product.description),
+    'category': (
+        ['category', 'category__id', 'category__name'],
+        lambda product: {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+    ),
+    'image': (['image'], lambda product: product.image.url),
+    'restaurant': (
+        ['id', 'name'],
+        lambda product: {
+            'id': product.id,
+            'name': product.name,
+        },
+    ),
+}
+
+
+def dump_products(products, fields=tuple(PRODUCT_FIELDS)):
+    return [
+        {field: PRODUCT_FIELDS[field][1](product) for field in fields}
+        for product in products
+    ]
+
+
+def normalize_product_fields(fields) -> tuple:
+    """Известные поля в порядке полного ответа, без повторов."""
+    unknown = set(fields) - set(PRODUCT_FIELDS)
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return tuple(field for field in PRODUCT_FIELDS if field in fields)
+
+
+def encode_product_cursor(product) -> str:
+    return encode_cursor([product.category_id, product.id])
+
+
+def decode_product_cursor(cursor: str):
+    category_id, product_id = decode_cursor(cursor, size=2)
+    if category_id is not None and not isinstance(category_id, int):
+        raise InvalidCursor(cursor)
+    if not isinstance(product_id, int):
+        raise InvalidCursor(cursor)
+    return category_id, product_id
+
+
+def paginate_products(products, cursor=None, page_size=50):
+    """Страница товаров по порядку (категория, id), товары без категории в конце."""
+    products = products.order_by(F('category_id').asc(nulls_last=True), 'id')
+    if cursor:
+        category_id, product_id = decode_product_cursor(cursor)
+        if category_id is None:
+            products = products.filter(category__isnull=True, id__gt=product_id)
+        else:
+            products = products.filter(
+                Q(category_id__gt=category_id)
+                | Q(category_id=category_id, id__gt=product_id)
+                | Q(category__isnull=True)
+            )
+
+    page = list(products[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_product_cursor(page[-1])
+
+
+def render_product_list(
+    category_id=None,
+    fields=tuple(PRODUCT_FIELDS),
+    cursor=None,
+    page_size=None,
+) -> bytes:
+    """Список товаров в продаже, с `page_size` — страница `{results, next}`.
+
+    Из базы читаются только колонки запрошенных полей и то, что нужно для
+    курсора.
+    """
+    columns = {'id', 'category'}
+    for field in fields:
+        columns.update(PRODUCT_FIELDS[field][0])
+    products = Product.objects.available().only(*columns)
+    if 'category' in fields:
+        products = products.select_related('category')
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+
+    if page_size is None:
+        return JSONRenderer().render(dump_products(products, fields))
+
+    page, next_cursor = paginate_products(products, cursor, page_size)
+    return JSONRenderer().render({
+        'results': dump_products(page, fields),
+        'next': next_cursor,
+    })
+
+
+def get_product_list(
+    category_id=None,
+    fields=tuple(PRODUCT_FIELDS),
+    cursor=None,
+    page_size=None,
+) -> PreencodedJSON:
+    """Отрендеренный список товаров текущего поколения каталога.
+
+    Поколение меняют сигналы при любом изменении товаров, категорий и меню
+    ресторанов, поэтому старые записи просто перестают читаться. Каждый
+    вариант запроса — категория, поля и размер страницы — кэшируется
+    отдельно. Страницы дальше первой не кэшируются: курсоров бесконечно
+    много, и каждый занял бы свою запись. В кэше лежит готовый документ
+    вместе со сжатой копией и ETag, а последние варианты — ещё и в памяти
+    процесса, чтобы не читать их из общего кэша на каждый запрос.
+    """
+    variant = (category_id, fields, cursor, page_size)
+    if cursor is not None:
+        return PreencodedJSON(render_product_list(*variant), time.time())
+
+    generation = get_generation(CATALOG_GENERATION)
+    if variant == (None, tuple(PRODUCT_FIELDS), None, None):
+        key = f'catalog:products:{generation}'
+    else:
+        variant_hash = hashlib.sha256(repr(variant).encode()).hexdigest()[:16]
+        key = f'catalog:products:{generation}:{variant_hash}'
+
+    document = _documents.get(key)
+    if document is not None:
+        return document
+    document = cache.get(key)
+    if document is None:
+        document = PreencodedJSON(render_product_list(*variant), time.time())
+        cache.set(key, document, timeout=CATALOG_CACHE_TIMEOUT)
+    _documents.set(key, document)
+    return document
+
+
+def get_banners() -> PreencodedJSON:
+    document = _local.get('banners')
+    if document is None:
+        document = PreencodedJSON(JSONRenderer().render(dump_banners()), time.time())
+        with _local_lock:
+            document = _local.setdefault('banners', document)
+    return document
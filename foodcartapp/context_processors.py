@@ -0,0 +1,9 @@
+from django.conf import settings
+
+from .snapshots import read_manifest
+
+
+def catalog_snapshot(request):
+    if not settings.CATALOG_SNAPSHOTS:
+        return {}
+    return {'catalog_snapshot': read_manifest()}
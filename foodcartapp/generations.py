@@ -0,0 +1,27 @@
+import time
+
+from django.core.cache import cache
+
+
+def _generation_key(name):
+    return f'generation:{name}'
+
+
+def get_generation(name) -> int:
+    key = _generation_key(name)
+    generation = cache.get(key)
+    if generation is None:
+        # Начинаем со времени, а не с нуля: после очистки кэша номер поколения
+        # не должен совпасть с одним из уже выданных.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name) -> int:
+    key = _generation_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+        return cache.get(key)
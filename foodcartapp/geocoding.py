@@ -0,0 +1,163 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from locations.geodata import fetch_coordinates_many, fetch_geocode_results_many
+from locations.models import Location
+
+from .candidates import refresh_order_candidates
+from .models import Order, Restaurant
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.ORDER_GEOCODE_WORKERS,
+    thread_name_prefix='order-geocode',
+)
+_retry_lock = threading.Lock()
+_retry_order_ids = set()
+_retry_timer = None
+_retry_at = None
+
+
+def geocode_orders(order_ids):
+    """Сохраняет координаты адресов доставки в заказы и пересчитывает кандидатов.
+
+    Ненайденный адрес помечает заказ как `GEOCODE_FAILED`. После сбоя
+    геокодера или пока он недоступен заказ остаётся в `GEOCODE_PENDING`
+    и геокодируется снова, когда у адреса откроется окно повтора.
+    """
+    orders = list(
+        Order.objects.filter(pk__in=order_ids).only('pk', 'address', 'canonical_address')
+    )
+    if not orders:
+        return
+
+    results = fetch_geocode_results_many([order.address for order in orders])
+    retry_orders = []
+    for order in orders:
+        coords, failure_reason = results.get(order.address, (None, Location.FAILURE_NOT_FOUND))
+        if coords is not None:
+            lon, lat = coords
+            geocode_status = Order.GEOCODE_OK
+        else:
+            lon = lat = None
+            if failure_reason == Location.FAILURE_NOT_FOUND:
+                geocode_status = Order.GEOCODE_FAILED
+            else:
+                geocode_status = Order.GEOCODE_PENDING
+                retry_orders.append(order)
+        # Адрес могли поменять, пока шло геокодирование: тогда заказ ждёт
+        # своей задачи
+        Order.objects.filter(pk=order.pk, address=order.address).update(
+            lon=lon,
+            lat=lat,
+            geocode_status=geocode_status,
+        )
+
+    refresh_order_candidates([order.pk for order in orders])
+    if retry_orders:
+        schedule_order_geocoding_retry(
+            [order.pk for order in retry_orders],
+            _retry_delay({order.canonical_address for order in retry_orders}),
+        )
+
+
+def geocode_restaurants(restaurants) -> list:
+    """Сохраняет координаты адресов в рестораны, возвращает ненайденные."""
+    restaurants = list(restaurants)
+    coords_by_address = fetch_coordinates_many(
+        [restaurant.address for restaurant in restaurants]
+    )
+    now = timezone.now()
+    geocoded, failed = [], []
+    for restaurant in restaurants:
+        coords = coords_by_address.get(restaurant.address)
+        if coords is None:
+            failed.append(restaurant)
+            continue
+        restaurant.lon, restaurant.lat = coords
+        restaurant.geocoded_at = now
+        geocoded.append(restaurant)
+    Restaurant.objects.bulk_update(geocoded, ['lon', 'lat', 'geocoded_at'])
+    return failed
+
+
+def schedule_order_geocoding(order_ids):
+    """Геокодирует заказы в фоне после коммита текущей транзакции."""
+    order_ids = list(order_ids)
+    if order_ids:
+        transaction.on_commit(lambda: _executor.submit(_geocode_orders_job, order_ids))
+
+
+def _geocode_orders_job(order_ids):
+    try:
+        geocode_orders(order_ids)
+    finally:
+        connections.close_all()
+
+
+def _retry_delay(canonical_addresses) -> float:
+    """Секунды до ближайшего повтора среди адресов.
+
+    Адрес без назначенного повтора не спрашивали из-за разомкнутой цепи:
+    его пробуем, когда цепь можно будет проверить снова.
+    """
+    now = timezone.now()
+    retry_times = dict(
+        Location.objects
+        .filter(canonical_address__in=canonical_addresses)
+        .values_list('canonical_address', 'next_retry_at')
+    )
+    delays = [
+        (retry_at - now).total_seconds()
+        if retry_at is not None and retry_at > now
+        else settings.GEOCODE_CIRCUIT_RECOVERY_TIMEOUT
+        for retry_at in (retry_times.get(address) for address in canonical_addresses)
+    ]
+    return min(delays)
+
+
+def schedule_order_geocoding_retry(order_ids, delay):
+    """Снова геокодирует заказы через `delay` секунд.
+
+    Все отложенные заказы ждут одного таймера на самый ранний повтор; те,
+    чьё окно ещё не открылось, просто откладываются дальше. Таймер живёт
+    в памяти процесса: после перезапуска такие заказы подберёт
+    `geocode_orders`.
+    """
+    global _retry_timer, _retry_at
+    retry_at = time.monotonic() + delay
+    with _retry_lock:
+        _retry_order_ids.update(order_ids)
+        if _retry_timer is not None:
+            if _retry_at <= retry_at:
+                return
+            _retry_timer.cancel()
+        _retry_timer = threading.Timer(delay, _flush_order_geocoding_retry)
+        _retry_timer.daemon = True
+        _retry_at = retry_at
+        _retry_timer.start()
+
+
+def _flush_order_geocoding_retry():
+    global _retry_timer
+    with _retry_lock:
+        order_ids = list(_retry_order_ids)
+        _retry_order_ids.clear()
+        _retry_timer = None
+    _executor.submit(_retry_order_geocoding_job, order_ids)
+
+
+def _retry_order_geocoding_job(order_ids):
+    try:
+        geocode_orders(
+            Order.objects
+            .not_finished()
+            .filter(pk__in=order_ids, geocode_status=Order.GEOCODE_PENDING)
+            .values_list('pk', flat=True)
+        )
+    finally:
+        connections.close_all()
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from foodcartapp.catalog import dump_banners, dump_products
+from foodcartapp.models import Product
+from foodcartapp.views import banners_list_api, product_list_api
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает число запросов в секунду к API каталога: готовые байты '
+        'из памяти против ответа DRF из уже загруженных данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.select_related('category').available())
+        banners = dump_banners()
+
+        @api_view(['GET'])
+        def drf_product_list(request):
+            return Response(dump_products(products))
+
+        @api_view(['GET'])
+        def drf_banners_list(request):
+            return Response(banners)
+
+        factory = RequestFactory()
+        cases = [
+            ('products, DRF', drf_product_list, {}),
+            ('products, байты', product_list_api, {}),
+            ('products, байты gzip', product_list_api, {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+            ('banners, DRF', drf_banners_list, {}),
+            ('banners, байты', banners_list_api, {}),
+            ('banners, байты gzip', banners_list_api, {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+        ]
+
+        self.stdout.write(f'Товаров в каталоге: {len(products)}')
+        for name, view, headers in cases:
+            request = factory.get('/api/', HTTP_ACCEPT='application/json', **headers)
+            # Первый запрос прогревает кэш, его не считаем
+            self.call(view, request)
+            started_at = time.perf_counter()
+            for _ in range(options['requests']):
+                size = len(self.call(view, request).content)
+            elapsed = time.perf_counter() - started_at
+            self.stdout.write(
+                f'{name}: {options["requests"] / elapsed:.0f} запросов/с, {size} байт'
+            )
+
+    def call(self, view, request):
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
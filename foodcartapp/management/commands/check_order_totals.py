@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сохранённую стоимость заказов с суммой их позиций'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='пересчитать стоимость расходящихся заказов',
+        )
+
+    def handle(self, *args, **options):
+        mismatched = list(
+            Order.objects
+            .with_computed_total_cost()
+            .exclude(total_cost=F('computed_total_cost'))
+            .values_list('pk', 'total_cost', 'computed_total_cost')
+        )
+        for order_id, total_cost, computed_total_cost in mismatched:
+            self.stdout.write(
+                f'Заказ {order_id}: сохранено {total_cost}, по позициям {computed_total_cost}'
+            )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+
+        if options['fix']:
+            Order.objects.filter(pk__in=[pk for pk, _, _ in mismatched]).update_total_cost()
+            self.stdout.write(self.style.SUCCESS(f'Исправлено заказов: {len(mismatched)}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Расходящихся заказов: {len(mismatched)}'))
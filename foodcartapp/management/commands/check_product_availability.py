@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from foodcartapp.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сохранённое число ресторанов с товаром в продаже с меню ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='пересчитать расходящиеся товары',
+        )
+
+    def handle(self, *args, **options):
+        mismatched = list(
+            Product.objects
+            .with_computed_restaurants_count()
+            .exclude(available_restaurants_count=F('computed_restaurants_count'))
+            .values_list('pk', 'available_restaurants_count', 'computed_restaurants_count')
+        )
+        for product_id, restaurants_count, computed_restaurants_count in mismatched:
+            self.stdout.write(
+                f'Товар {product_id}: сохранено {restaurants_count}, по меню {computed_restaurants_count}'
+            )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+
+        if options['fix']:
+            Product.objects.filter(
+                pk__in=[pk for pk, _, _ in mismatched]
+            ).update_available_restaurants_count()
+            self.stdout.write(self.style.SUCCESS(f'Исправлено товаров: {len(mismatched)}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Расходящихся товаров: {len(mismatched)}'))
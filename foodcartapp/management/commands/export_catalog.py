@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.snapshots import export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Выгружает каталог товаров и баннеры в статические JSON-файлы для фронтенда'
+
+    def handle(self, *args, **options):
+        manifest = export_catalog()
+        self.stdout.write(self.style.SUCCESS(f'Товары: {manifest["products"]}'))
+        self.stdout.write(self.style.SUCCESS(f'Баннеры: {manifest["banners"]}'))
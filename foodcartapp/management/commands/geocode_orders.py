@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.geocoding import geocode_orders
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Геокодирует незавершённые заказы, которые не успели обработать в фоне, '
+        'например из-за перезапуска сервера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='повторить и заказы, адрес которых не удалось определить',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='сколько заказов геокодировать за раз',
+        )
+
+    def handle(self, *args, **options):
+        statuses = [Order.GEOCODE_PENDING]
+        if options['retry_failed']:
+            statuses.append(Order.GEOCODE_FAILED)
+        order_ids = list(
+            Order.objects
+            .not_finished()
+            .filter(geocode_status__in=statuses)
+            .values_list('pk', flat=True)
+        )
+
+        batch_size = options['batch_size']
+        for start in range(0, len(order_ids), batch_size):
+            geocode_orders(order_ids[start:start + batch_size])
+
+        counts = {
+            status: Order.objects.filter(pk__in=order_ids, geocode_status=status).count()
+            for status, _ in Order.GEOCODE_STATUS_CHOICES
+        }
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано заказов: {len(order_ids)}, '
+            f'с координатами: {counts[Order.GEOCODE_OK]}, '
+            f'не найдено: {counts[Order.GEOCODE_FAILED]}, '
+            f'ждут геокодера: {counts[Order.GEOCODE_PENDING]}'
+        ))
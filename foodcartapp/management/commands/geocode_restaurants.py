@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.candidates import refresh_all_candidates
+from foodcartapp.geocoding import geocode_restaurants
+from foodcartapp.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Заполняет координаты ресторанов по их адресам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='обновить координаты всех ресторанов, а не только тех, где их нет',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.exclude(address='')
+        if not options['all']:
+            restaurants = restaurants.filter(geocoded_at__isnull=True)
+        restaurants = list(restaurants)
+
+        failed = geocode_restaurants(restaurants)
+        for restaurant in failed:
+            self.stdout.write(
+                self.style.WARNING(f'{restaurant.name}: не удалось определить «{restaurant.address}»')
+            )
+        if len(failed) < len(restaurants):
+            refresh_all_candidates()
+        self.stdout.write(self.style.SUCCESS(
+            f'Координаты определены у {len(restaurants) - len(failed)} из {len(restaurants)} ресторанов'
+        ))
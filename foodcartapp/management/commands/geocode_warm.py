@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order, Restaurant
+from locations.geodata import (
+    addresses_to_geocode,
+    fetch_geocode_results_many,
+    geocoder_stats,
+)
+from locations.models import Location
+from locations.normalization import canonicalize_address
+
+DEFAULT_CHECKPOINT = os.path.join(tempfile.gettempdir(), 'star_burger_geocode_warm.json')
+
+
+class Command(BaseCommand):
+    help = (
+        'Заранее геокодирует адреса ресторанов и незавершённых заказов. '
+        'Прогресс сохраняется в файл, прерванный прогон продолжается с того же места'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.GEOCODE_MAX_WORKERS,
+            help='число параллельных запросов к геокодеру',
+        )
+        parser.add_argument(
+            '--rps',
+            type=float,
+            default=settings.GEOCODE_REQUESTS_PER_SECOND,
+            help='не больше стольких запросов к геокодеру в секунду',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='сколько адресов обрабатывать между сохранениями прогресса',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=DEFAULT_CHECKPOINT,
+            help='файл с прогрессом',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='начать заново, не глядя на сохранённый прогресс',
+        )
+
+    def handle(self, *args, **options):
+        # Какие адреса уже готовы, видно по базе: свежие и ждущие повтора
+        # команда не запрашивает. В файле только статистика прерванного прогона
+        checkpoint_path = options['checkpoint']
+        stats = Counter()
+        if not options['reset'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as checkpoint_file:
+                stats.update(json.load(checkpoint_file)['stats'])
+            # Эти счётчики считаются заново: адреса, готовые к этому запуску,
+            # уже посчитаны, а незапрошенные будут запрошены снова
+            del stats['skipped'], stats['not_requested']
+            self.stdout.write(
+                f'Продолжаем прогон: уже запрошено адресов {stats["requested"]}'
+            )
+
+        addresses = sorted(self.collect_addresses().items())
+        self.stdout.write(f'Адресов всего: {len(addresses)}')
+
+        started_at = time.monotonic()
+        try:
+            for start in range(0, len(addresses), options['batch_size']):
+                batch = addresses[start:start + options['batch_size']]
+                self.warm_batch(batch, options, stats)
+                self.save_checkpoint(checkpoint_path, stats)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(
+                f'Прервано, прогресс сохранён в {checkpoint_path}'
+            ))
+            self.report(stats, time.monotonic() - started_at)
+            return
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.report(stats, time.monotonic() - started_at)
+
+    def collect_addresses(self):
+        addresses = {}
+        restaurant_addresses = Restaurant.objects.values_list('address', flat=True)
+        order_addresses = Order.objects.not_finished().values_list('address', flat=True)
+        for address in [*restaurant_addresses, *order_addresses]:
+            canonical_address = canonicalize_address(address)
+            if canonical_address:
+                addresses.setdefault(canonical_address, address)
+        return addresses
+
+    def warm_batch(self, batch, options, stats):
+        to_geocode = addresses_to_geocode(address for _, address in batch)
+        stats['skipped'] += len(batch) - len(to_geocode)
+        if not to_geocode:
+            return
+
+        started_at = time.monotonic()
+        results = fetch_geocode_results_many(
+            [address for canonical_address, address in batch if canonical_address in to_geocode],
+            max_workers=options['workers'],
+            requests_per_second=options['rps'],
+        )
+        stats['geocode_seconds'] += time.monotonic() - started_at
+
+        for _, failure_reason in results.values():
+            if failure_reason is None:
+                # Геокодер недоступен: адрес останется на следующий запуск
+                stats['not_requested'] += 1
+                continue
+            stats['requested'] += 1
+            if failure_reason:
+                stats[f'failed_{failure_reason}'] += 1
+                stats['failed'] += 1
+
+    def save_checkpoint(self, path, stats):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump({'stats': stats}, checkpoint_file)
+        os.replace(tmp_path, path)
+
+    def report(self, stats, elapsed):
+        requested = stats['requested']
+        geocode_seconds = stats['geocode_seconds']
+        throughput = requested / geocode_seconds if geocode_seconds else 0
+        self.stdout.write(f'Свежих или ждущих повтора, не запрашивали: {stats["skipped"]}')
+        self.stdout.write(f'Запросов к геокодеру: {requested}')
+        self.stdout.write(f'Время этого прогона: {elapsed:.1f} с')
+        self.stdout.write(f'Пропускная способность: {throughput:.1f} адресов/с')
+
+        http_stats = geocoder_stats()
+        if http_stats:
+            self.stdout.write(
+                f'Попыток HTTP: {http_stats["attempts"]}, повторов: {http_stats["retries"]}, '
+                f'средняя задержка: {http_stats["latency_avg"] * 1000:.0f} мс, '
+                f'максимальная: {http_stats["latency_max"] * 1000:.0f} мс'
+            )
+            self.stdout.write(
+                f'Соединений открыто: {http_stats["connections_opened"]}, '
+                f'переиспользовано: {http_stats["connections_reused"]}'
+            )
+
+        failure_reasons = dict(Location.FAILURE_CHOICES)
+        for reason, label in failure_reasons.items():
+            if stats[f'failed_{reason}']:
+                self.stdout.write(f'  {label}: {stats[f"failed_{reason}"]}')
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(f'Не удалось геокодировать: {stats["failed"]}'))
+        if stats['not_requested']:
+            self.stdout.write(self.style.WARNING(
+                f'Геокодер был недоступен, не запрашивали: {stats["not_requested"]}. '
+                'Запустите команду ещё раз позже'
+            ))
+        if not stats['failed'] and not stats['not_requested']:
+            self.stdout.write(self.style.SUCCESS('Все адреса геокодированы'))
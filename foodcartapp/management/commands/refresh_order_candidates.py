@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.candidates import refresh_all_candidates
+from foodcartapp.models import OrderCandidate
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рестораны-кандидаты для всех незавершённых заказов'
+
+    def handle(self, *args, **options):
+        refresh_all_candidates()
+        self.stdout.write(
+            self.style.SUCCESS(f'Кандидатов в таблице: {OrderCandidate.objects.count()}')
+        )
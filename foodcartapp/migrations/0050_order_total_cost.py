@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0049_ordercandidate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=8, verbose_name='стоимость'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:26
+
+from django.db import migrations
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_total_cost(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItems = apps.get_model('foodcartapp', 'OrderItems')
+    line_total = ExpressionWrapper(
+        F('quantity') * F('price'),
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+    items_total = (
+        OrderItems.objects
+        .filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum(line_total))
+        .values('total')
+    )
+    Order.objects.update(
+        total_cost=Coalesce(
+            Subquery(items_total),
+            Value(0),
+            output_field=DecimalField(max_digits=8, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0050_order_total_cost'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_order_total_cost, migrations.RunPython.noop),
+    ]
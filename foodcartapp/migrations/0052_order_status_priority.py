@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_fill_order_total_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status_priority',
+            field=models.PositiveSmallIntegerField(default=1, editable=False, verbose_name='приоритет статуса'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status_priority', 'registered_at', 'id'], name='foodcartapp_status__3acc39_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'status_priority', 'registered_at', 'id'], name='foodcartapp_status_92f813_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_method', 'status_priority', 'registered_at', 'id'], name='foodcartapp_payment_686134_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['cooking_restaurant', 'status_priority', 'registered_at', 'id'], name='foodcartapp_cooking_87575b_idx'),
+        ),
+    ]
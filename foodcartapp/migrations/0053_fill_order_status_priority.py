@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:27
+
+from django.db import migrations
+
+
+STATUS_PRIORITIES = {
+    'NEW': 1,
+    'ASSEMBLING': 2,
+    'DELIVERING': 3,
+    'FINISHED': 4,
+}
+
+
+def fill_status_priority(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    for status, priority in STATUS_PRIORITIES.items():
+        Order.objects.filter(status=status).update(status_priority=priority)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_order_status_priority'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_status_priority, migrations.RunPython.noop),
+    ]
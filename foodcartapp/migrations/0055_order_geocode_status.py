@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='geocode_status',
+            field=models.CharField(choices=[('pending', 'ещё не определены'), ('ok', 'определены'), ('failed', 'не удалось определить')], db_index=True, default='pending', editable=False, max_length=10, verbose_name='координаты'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lat',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='широта'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lon',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='долгота'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Копия locations.normalization на момент написания миграции: если
+# нормализацию потом поменяют, миграция должна делать с данными то же, что и
+# раньше
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'пос': 'поселок',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+    'эт': 'этаж',
+    'под': 'подъезд',
+}
+TOKEN_PATTERN = re.compile(r'\w+(?:-\w+)*')
+
+
+def canonicalize_address(address):
+    text = unicodedata.normalize('NFKC', address).casefold().replace('ё', 'е')
+    tokens = [
+        ABBREVIATIONS.get(token, token)
+        for token in TOKEN_PATTERN.findall(text)
+    ]
+    tokens = [
+        token for token, next_token in zip(tokens, tokens[1:] + [''])
+        if not (token == 'дом' and next_token[:1].isdigit())
+    ]
+    return ' '.join(tokens)[:255]
+
+
+def fill_order_coordinates(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    Location = apps.get_model('locations', 'Location')
+    locations = {
+        location.canonical_address: location
+        for location in Location.objects.all()
+    }
+
+    orders = list(Order.objects.exclude(status='FINISHED'))
+    for order in orders:
+        location = locations.get(canonicalize_address(order.address))
+        if location is None:
+            continue
+        if location.lon is not None and location.lat is not None:
+            order.lon, order.lat = location.lon, location.lat
+            order.geocode_status = 'ok'
+        elif location.failure_reason:
+            order.geocode_status = 'failed'
+    Order.objects.bulk_update(orders, ['lon', 'lat', 'geocode_status'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_order_geocode_status'),
+        ('locations', '0006_alter_location_canonical_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_order_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Копия locations.normalization на момент написания миграции: если
+# нормализацию потом поменяют, миграция должна делать с данными то же, что и
+# раньше
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'пос': 'поселок',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+    'эт': 'этаж',
+    'под': 'подъезд',
+}
+TOKEN_PATTERN = re.compile(r'\w+(?:-\w+)*')
+
+
+def canonicalize_address(address):
+    text = unicodedata.normalize('NFKC', address).casefold().replace('ё', 'е')
+    tokens = [
+        ABBREVIATIONS.get(token, token)
+        for token in TOKEN_PATTERN.findall(text)
+    ]
+    tokens = [
+        token for token, next_token in zip(tokens, tokens[1:] + [''])
+        if not (token == 'дом' and next_token[:1].isdigit())
+    ]
+    return ' '.join(tokens)[:255]
+
+
+def fill_restaurant_coordinates(apps, schema_editor):
+    Restaurant = apps.get_model('foodcartapp', 'Restaurant')
+    Location = apps.get_model('locations', 'Location')
+    locations = {
+        location.canonical_address: location
+        for location in Location.objects.filter(lon__isnull=False, lat__isnull=False)
+    }
+
+    restaurants = []
+    for restaurant in Restaurant.objects.all():
+        location = locations.get(canonicalize_address(restaurant.address))
+        if location is None:
+            continue
+        restaurant.lon, restaurant.lat = location.lon, location.lat
+        restaurant.geocoded_at = location.updated_at
+        restaurants.append(restaurant)
+    Restaurant.objects.bulk_update(restaurants, ['lon', 'lat', 'geocoded_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0057_restaurant_coordinates'),
+        ('locations', '0006_alter_location_canonical_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_restaurant_coordinates, migrations.RunPython.noop),
+    ]
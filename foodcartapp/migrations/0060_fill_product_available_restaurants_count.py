@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_available_restaurants_count(apps, schema_editor):
+    Product = apps.get_model('foodcartapp', 'Product')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+    restaurants_count = (
+        RestaurantMenuItem.objects
+        .filter(product=OuterRef('pk'), availability=True)
+        .values('product')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Product.objects.update(
+        available_restaurants_count=Coalesce(Subquery(restaurants_count), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_product_available_restaurants_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_available_restaurants_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0061_product_category_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='canonical_address',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='нормализованный адрес'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='canonical_address',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='нормализованный адрес'),
+        ),
+    ]
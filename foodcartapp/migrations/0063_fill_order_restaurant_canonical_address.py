@@ -0,0 +1,69 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Копия locations.normalization на момент написания миграции: если
+# нормализацию потом поменяют, миграция должна делать с данными то же, что и
+# раньше
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'пос': 'поселок',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+    'эт': 'этаж',
+    'под': 'подъезд',
+}
+TOKEN_PATTERN = re.compile(r'\w+(?:-\w+)*')
+
+
+def canonicalize_address(address):
+    text = unicodedata.normalize('NFKC', address).casefold().replace('ё', 'е')
+    tokens = [
+        ABBREVIATIONS.get(token, token)
+        for token in TOKEN_PATTERN.findall(text)
+    ]
+    tokens = [
+        token for token, next_token in zip(tokens, tokens[1:] + [''])
+        if not (token == 'дом' and next_token[:1].isdigit())
+    ]
+    return ' '.join(tokens)[:255]
+
+
+def fill_canonical_addresses(apps, schema_editor):
+    for model_name in ['Order', 'Restaurant']:
+        model = apps.get_model('foodcartapp', model_name)
+        objs = list(model.objects.only('pk', 'address'))
+        for obj in objs:
+            obj.canonical_address = canonicalize_address(obj.address)
+        model.objects.bulk_update(objs, ['canonical_address'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0062_order_restaurant_canonical_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_canonical_addresses, migrations.RunPython.noop),
+    ]
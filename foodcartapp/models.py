@@ -1,11 +1,18 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from phonenumber_field.modelfields import PhoneNumberField
 
-from django.db.models import F, Sum, DecimalField, ExpressionWrapper, Value
+from django.db.models import DEFERRED, F, Sum, Count, Q, DecimalField, ExpressionWrapper, Value, OuterRef, Subquery
 from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.utils import timezone
 
+from locations.normalization import CANONICAL_ADDRESS_MAX_LENGTH, canonicalize_address
+
+
+# Массовое изменение меню в обход `save` и `delete`, аргумент `product_ids`
+menu_items_changed = Signal()
+
 
 class Restaurant(models.Model):
     name = models.CharField(
@@ -17,11 +24,26 @@ class Restaurant(models.Model):
         max_length=100,
         blank=True,
     )
+    canonical_address = models.CharField(
+        'нормализованный адрес',
+        max_length=CANONICAL_ADDRESS_MAX_LENGTH,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
     contact_phone = models.CharField(
         'контактный телефон',
         max_length=50,
         blank=True,
     )
+    lon = models.FloatField('долгота', null=True, blank=True, editable=False)
+    lat = models.FloatField('широта', null=True, blank=True, editable=False)
+    geocoded_at = models.DateTimeField(
+        'координаты определены',
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'ресторан'
@@ -30,31 +52,134 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def coords(self):
+        if self.lon is None or self.lat is None:
+            return None
+        return self.lon, self.lat
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_coords = (loaded.get('lon', DEFERRED), loaded.get('lat', DEFERRED))
+        return instance
+
+    @property
+    def coords_changed(self):
+        """Отличаются ли координаты от тех, что были в базе при загрузке."""
+        return (self.lon, self.lat) != getattr(self, '_loaded_coords', (None, None))
+
+    def save(self, *args, **kwargs):
+        self.canonical_address = canonicalize_address(self.address)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'address' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'canonical_address'}
+        super().save(*args, **kwargs)
+        if update_fields is None or {'lon', 'lat'} & set(update_fields):
+            self._loaded_coords = (self.lon, self.lat)
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
+        return self.filter(available_restaurants_count__gt=0)
+
+    def with_computed_restaurants_count(self):
+        return self.annotate(
+            computed_restaurants_count=Count(
+                'menu_items',
+                filter=Q(menu_items__availability=True),
+            )
+        )
+
+    def update_available_restaurants_count(self):
+        restaurants_count = (
             RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+            .filter(product=OuterRef('pk'), availability=True)
+            .values('product')
+            .annotate(count=Count('pk'))
+            .values('count')
         )
-        return self.filter(pk__in=products)
+        return self.update(
+            available_restaurants_count=Coalesce(
+                Subquery(restaurants_count),
+                Value(0),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+
+class RestaurantMenuItemQuerySet(models.QuerySet):
+    """Массовые операции с меню, после которых пересчитывается доступность товаров.
+
+    `save` и `delete` отдельных пунктов обрабатывают сигналы, а `update` и
+    `bulk_create` сигналов не шлют: они сами пересчитывают товары и шлют
+    `menu_items_changed` со списком затронутых товаров.
+    """
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            rows = dict(self.values_list('pk', 'product_id'))
+            updated = super().update(**kwargs)
+            product_ids = set(rows.values())
+            if 'product' in kwargs or 'product_id' in kwargs:
+                # Новое значение может быть выражением, например `Case` из
+                # `bulk_update`, поэтому новые товары читаем из самих строк
+                product_ids.update(
+                    self.model.objects
+                    .filter(pk__in=rows)
+                    .values_list('product_id', flat=True)
+                )
+            self._products_changed(product_ids)
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            self._products_changed({menu_item.product_id for menu_item in created})
+        return created
+
+    def _products_changed(self, product_ids):
+        if not product_ids:
+            return
+        Product.objects.filter(pk__in=product_ids).update_available_restaurants_count()
+        menu_items_changed.send(sender=self.model, product_ids=product_ids)
+
+
+def _line_total(prefix=''):
+    return ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}price'),
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
 
 
 class OrderQuerySet(models.QuerySet):
-    def with_total_cost(self):
-        line_total = ExpressionWrapper(
-            F('items__quantity') * F('items__price'),
-            output_field=DecimalField(max_digits=8, decimal_places=2),
-        )
+    def with_computed_total_cost(self):
         return self.annotate(
-            total_cost=Coalesce(
-                Sum(line_total),
+            computed_total_cost=Coalesce(
+                Sum(_line_total('items__')),
                 Value(0),
                 output_field=DecimalField(max_digits=8, decimal_places=2),
             )
         )
-    
+
+    def update_total_cost(self):
+        items_total = (
+            OrderItems.objects
+            .filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Sum(_line_total()))
+            .values('total')
+        )
+        return self.update(
+            total_cost=Coalesce(
+                Subquery(items_total),
+                Value(0),
+                output_field=DecimalField(max_digits=8, decimal_places=2),
+            ),
+            updated_at=timezone.now(),
+        )
+
     def not_finished(self):
         return self.exclude(status=Order.STATUS_FINISHED)
 
@@ -105,16 +230,43 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    available_restaurants_count = models.PositiveIntegerField(
+        'в продаже в ресторанах',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
 
     objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'товар'
         verbose_name_plural = 'товары'
+        indexes = [
+            models.Index(fields=['category', 'id']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Счётчик ресторанов ведут сигналы меню запросами UPDATE: сохранение
+        # товара, загруженного раньше, не должно затирать его старым значением
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred_fields
+                and field.name != 'available_restaurants_count'
+            ]
+        super().save(*args, **kwargs)
+
 
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
@@ -135,6 +287,8 @@ class RestaurantMenuItem(models.Model):
         db_index=True
     )
 
+    objects = RestaurantMenuItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'пункт меню ресторана'
         verbose_name_plural = 'пункты меню ресторана'
@@ -157,6 +311,20 @@ class Order(models.Model):
         (STATUS_DELIVERING, 'Доставка'),
         (STATUS_FINISHED, 'Завершён'),
     ]
+    STATUS_PRIORITIES = {
+        STATUS_NEW: 1,
+        STATUS_ASSEMBLING: 2,
+        STATUS_DELIVERING: 3,
+        STATUS_FINISHED: 4,
+    }
+    GEOCODE_PENDING = 'pending'
+    GEOCODE_OK = 'ok'
+    GEOCODE_FAILED = 'failed'
+    GEOCODE_STATUS_CHOICES = [
+        (GEOCODE_PENDING, 'ещё не определены'),
+        (GEOCODE_OK, 'определены'),
+        (GEOCODE_FAILED, 'не удалось определить'),
+    ]
     PAYMENT_METHOD_CASH = 'cash'
     PAYMENT_METHOD_NON_CASH = 'non-cash'
     PAYMENT_METHOD_CHOICES = [
@@ -168,8 +336,33 @@ class Order(models.Model):
     lastname = models.CharField('фамилия', max_length=50)
     phonenumber = PhoneNumberField('телефон', db_index=True)
     address = models.CharField('адрес', max_length=200)
+    canonical_address = models.CharField(
+        'нормализованный адрес',
+        max_length=CANONICAL_ADDRESS_MAX_LENGTH,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
     comment = models.CharField('комментарий', max_length=200, blank=True)
+    lon = models.FloatField('долгота', null=True, blank=True, editable=False)
+    lat = models.FloatField('широта', null=True, blank=True, editable=False)
+    geocode_status = models.CharField(
+        'координаты',
+        max_length=10,
+        choices=GEOCODE_STATUS_CHOICES,
+        default=GEOCODE_PENDING,
+        editable=False,
+        db_index=True,
+    )
+    total_cost = models.DecimalField(
+        'стоимость',
+        max_digits=8,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+    )
     registered_at = models.DateTimeField('создан', default=timezone.now, db_index=True)
+    updated_at = models.DateTimeField('изменён', auto_now=True)
     called_at = models.DateTimeField('время звонка', null=True, blank=True, db_index=True)
     delivered_at = models.DateTimeField('доставлен', null=True, blank=True, db_index=True)
     status = models.CharField(
@@ -179,6 +372,11 @@ class Order(models.Model):
         default=STATUS_NEW, 
         db_index=True
     )
+    status_priority = models.PositiveSmallIntegerField(
+        'приоритет статуса',
+        default=STATUS_PRIORITIES[STATUS_NEW],
+        editable=False,
+    )
     payment_method = models.CharField(
         'способ оплаты', 
         max_length=10, 
@@ -199,10 +397,36 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(fields=['status_priority', 'registered_at', 'id']),
+            models.Index(fields=['status', 'status_priority', 'registered_at', 'id']),
+            models.Index(fields=['payment_method', 'status_priority', 'registered_at', 'id']),
+            models.Index(fields=['cooking_restaurant', 'status_priority', 'registered_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
+        ]
     
     def __str__(self):
         return f'Заказ {self.pk} - {self.firstname} {self.lastname}'
 
+    @property
+    def coords(self):
+        if self.lon is None or self.lat is None:
+            return None
+        return self.lon, self.lat
+
+    def save(self, *args, **kwargs):
+        self.status_priority = self.STATUS_PRIORITIES[self.status]
+        self.canonical_address = canonicalize_address(self.address)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'status' in update_fields:
+                update_fields.add('status_priority')
+            if 'address' in update_fields:
+                update_fields.add('canonical_address')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
 
 class OrderItems(models.Model):
     order = models.ForeignKey(
@@ -238,3 +462,32 @@ class OrderItems(models.Model):
 
     def __str__(self):
         return f'{self.product.name} x {self.quantity} (заказ {self.order_id})'
+
+
+class OrderCandidate(models.Model):
+    order = models.ForeignKey(
+        Order,
+        related_name='candidates',
+        verbose_name='заказ',
+        on_delete=models.CASCADE,
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        related_name='order_candidates',
+        verbose_name='ресторан',
+        on_delete=models.CASCADE,
+    )
+    distance = models.FloatField('расстояние, км')
+
+    class Meta:
+        verbose_name = 'ресторан-кандидат'
+        verbose_name_plural = 'рестораны-кандидаты'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(fields=['order', 'distance']),
+        ]
+
+    def __str__(self):
+        return f'{self.restaurant.name} - {self.distance:.3f} км (заказ {self.order_id})'
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from phonenumber_field.serializerfields import PhoneNumberField
+from .geocoding import schedule_order_geocoding
 from .models import Order, OrderItems, Product
 from django.db import IntegrityError, transaction
 
@@ -25,7 +26,10 @@ class OrderSerializer(serializers.ModelSerializer):
         products_data = validated_data.pop('products')
         try:
             with transaction.atomic():
-                order = Order.objects.create(**validated_data)
+                total_cost = sum(
+                    item['product'].price * item['quantity'] for item in products_data
+                )
+                order = Order.objects.create(**validated_data, total_cost=total_cost)
     
                 items = []
                 for item in products_data:
@@ -38,6 +42,7 @@ class OrderSerializer(serializers.ModelSerializer):
                         price=product.price,
                     ))
                 OrderItems.objects.bulk_create(items)
+                schedule_order_geocoding([order.pk])
 
                 return order
         except IntegrityError as e:
@@ -0,0 +1,162 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from locations.models import Location, locations_saved
+
+from .candidates import schedule_candidates_refresh
+from .geocoding import schedule_order_geocoding
+from .generations import bump_generation
+from .snapshots import schedule_catalog_export
+from .catalog import CATALOG_GENERATION
+from .models import (
+    Order,
+    OrderItems,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+    menu_items_changed,
+)
+
+
+def _unfinished_order_ids(**filters):
+    return Order.objects.not_finished().filter(**filters).values_list('pk', flat=True)
+
+
+@receiver(post_save, sender=Order)
+def refresh_order_candidates_on_order_save(sender, instance, **kwargs):
+    schedule_candidates_refresh([instance.pk])
+
+
+@receiver(post_save, sender=OrderItems)
+@receiver(post_delete, sender=OrderItems)
+def refresh_order_candidates_on_items_change(sender, instance, **kwargs):
+    schedule_candidates_refresh([instance.order_id])
+
+
+@receiver(post_save, sender=OrderItems)
+@receiver(post_delete, sender=OrderItems)
+def update_order_total_cost(sender, instance, **kwargs):
+    Order.objects.filter(pk=instance.order_id).update_total_cost()
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def refresh_order_candidates_on_menu_change(sender, instance, **kwargs):
+    schedule_candidates_refresh(
+        _unfinished_order_ids(items__product_id=instance.product_id)
+    )
+
+
+@receiver(menu_items_changed, sender=RestaurantMenuItem)
+def refresh_order_candidates_on_menu_bulk_change(sender, product_ids, **kwargs):
+    schedule_candidates_refresh(
+        _unfinished_order_ids(items__product_id__in=product_ids)
+    )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_product_availability(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).update_available_restaurants_count()
+
+
+@receiver(post_save, sender=Restaurant)
+def refresh_order_candidates_on_restaurant_save(sender, instance, update_fields, **kwargs):
+    # Кандидатов меняют только координаты, а не название или телефон
+    if update_fields is not None and not {'lon', 'lat'} & set(update_fields):
+        return
+    if instance.coords_changed:
+        schedule_candidates_refresh(_unfinished_order_ids())
+
+
+@receiver(pre_delete, sender=Restaurant)
+def refresh_order_candidates_on_restaurant_delete(sender, instance, **kwargs):
+    # После удаления кандидатов ресторана уже не найти: каскад их удалит
+    schedule_candidates_refresh(
+        _unfinished_order_ids(candidates__restaurant=instance)
+    )
+
+
+@receiver(post_save, sender=Location)
+def refresh_order_candidates_on_location_save(sender, instance, **kwargs):
+    _apply_geocoded_locations([instance])
+
+
+@receiver(locations_saved, sender=Location)
+def refresh_order_candidates_on_locations_bulk_save(sender, locations, **kwargs):
+    _apply_geocoded_locations(locations)
+
+
+def _apply_geocoded_locations(locations):
+    """Переносит координаты адресов в рестораны и перегеокодирует заказы."""
+    canonical_addresses = {location.canonical_address for location in locations}
+    restaurant_addresses = set(
+        Restaurant.objects
+        .filter(canonical_address__in=canonical_addresses)
+        .values_list('canonical_address', flat=True)
+    )
+    restaurants_updated = False
+    for location in locations:
+        if location.canonical_address not in restaurant_addresses:
+            continue
+        if location.lon is None or location.lat is None:
+            continue
+        Restaurant.objects.filter(
+            canonical_address=location.canonical_address,
+        ).update(
+            lon=location.lon,
+            lat=location.lat,
+            geocoded_at=timezone.now(),
+        )
+        restaurants_updated = True
+    if restaurants_updated:
+        schedule_candidates_refresh(_unfinished_order_ids())
+
+    schedule_order_geocoding(
+        _unfinished_order_ids(canonical_address__in=canonical_addresses)
+    )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+@receiver(menu_items_changed, sender=RestaurantMenuItem)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def bump_dashboard_generation(sender, **kwargs):
+    bump_generation('dashboard')
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def bump_dashboard_generation_on_location_change(sender, instance, **kwargs):
+    _bump_dashboard_generation_for([instance.canonical_address])
+
+
+@receiver(locations_saved, sender=Location)
+def bump_dashboard_generation_on_locations_bulk_save(sender, locations, **kwargs):
+    _bump_dashboard_generation_for(
+        [location.canonical_address for location in locations]
+    )
+
+
+def _bump_dashboard_generation_for(canonical_addresses):
+    # Геокодирование чужих адресов не должно сбрасывать весь кэш страницы заказов
+    if _unfinished_order_ids(canonical_address__in=canonical_addresses).exists():
+        bump_generation('dashboard')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+@receiver(menu_items_changed, sender=RestaurantMenuItem)
+def bump_catalog_generation(sender, **kwargs):
+    # После коммита: иначе параллельный запрос успеет закэшировать под новым
+    # поколением ещё старый каталог
+    transaction.on_commit(lambda: bump_generation(CATALOG_GENERATION))
+    schedule_catalog_export()
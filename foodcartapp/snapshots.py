@@ -0,0 +1,154 @@
+"""Статические снимки каталога.
+
+Список товаров и баннеры пишутся в `STATIC_ROOT/catalog/` файлами с хэшем
+содержимого в имени, поэтому их можно раздавать веб-сервером и кэшировать
+навсегда. Какие файлы сейчас актуальны, записано в `manifest.json`; его
+содержимое попадает на главную страницу, и фронтенд грузит каталог оттуда,
+не обращаясь к Django.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework.renderers import JSONRenderer
+
+from .catalog import dump_banners, render_product_list
+from .generations import bump_generation, get_generation
+
+SNAPSHOT_DIR = 'catalog'
+MANIFEST_NAME = 'manifest.json'
+SNAPSHOT_GENERATION = 'catalog_snapshot'
+# Файлы моложе этого не удаляем: их мог только что записать параллельный
+# экспорт, чей манифест ещё не сохранён
+SNAPSHOT_GRACE_PERIOD = 10 * 60
+
+_manifest_lock = threading.Lock()
+_manifest_cache = {}
+_export_lock = threading.Lock()
+_export_queued = threading.Event()
+_executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='catalog-export',
+)
+
+
+def _snapshot_dir():
+    return os.path.join(settings.STATIC_ROOT, SNAPSHOT_DIR)
+
+
+def _write_atomic(path, content: bytes):
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path),
+        prefix='.tmp-',
+        delete=False,
+    ) as file:
+        file.write(content)
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def _write_snapshot(name, body: bytes) -> str:
+    filename = f'{name}.{hashlib.sha256(body).hexdigest()[:12]}.json'
+    path = os.path.join(_snapshot_dir(), filename)
+    if not os.path.exists(path):
+        _write_atomic(path, body)
+    return filename
+
+
+def _load_manifest():
+    try:
+        with open(os.path.join(_snapshot_dir(), MANIFEST_NAME), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest():
+    """Текущий манифест снимков или `None`, если снимков ещё нет.
+
+    Файл перечитывается, только когда экспорт сменил поколение снимков.
+    """
+    generation = get_generation(SNAPSHOT_GENERATION)
+    with _manifest_lock:
+        if _manifest_cache.get('generation') != generation:
+            _manifest_cache['manifest'] = _load_manifest()
+            _manifest_cache['generation'] = generation
+        return _manifest_cache['manifest']
+
+
+def export_catalog() -> dict:
+    with _export_lock:
+        manifest = _export_catalog()
+    bump_generation(SNAPSHOT_GENERATION)
+    return manifest
+
+
+def _export_catalog():
+    os.makedirs(_snapshot_dir(), exist_ok=True)
+    previous_manifest = _load_manifest() or {}
+
+    files = {
+        'products': _write_snapshot('products', render_product_list()),
+        'banners': _write_snapshot('banners', JSONRenderer().render(dump_banners())),
+    }
+    url_prefix = f'{settings.STATIC_URL}{SNAPSHOT_DIR}/'
+    manifest = {
+        'products': url_prefix + files['products'],
+        'banners': url_prefix + files['banners'],
+        'generated_at': int(time.time()),
+    }
+    _write_atomic(
+        os.path.join(_snapshot_dir(), MANIFEST_NAME),
+        json.dumps(manifest).encode(),
+    )
+
+    # Предыдущие файлы оставляем: их могут догружать уже открытые страницы
+    keep = {MANIFEST_NAME, *files.values()} | {
+        url.rsplit('/', 1)[-1]
+        for key, url in previous_manifest.items()
+        if key in files
+    }
+    removable_before = time.time() - SNAPSHOT_GRACE_PERIOD
+    for filename in os.listdir(_snapshot_dir()):
+        if not filename.endswith('.json') or filename in keep:
+            continue
+        path = os.path.join(_snapshot_dir(), filename)
+        try:
+            if os.path.getmtime(path) < removable_before:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    return manifest
+
+
+def schedule_catalog_export():
+    """Пересобирает снимки в фоне после коммита.
+
+    Пока экспорт стоит в очереди, новые запросы на него ничего не добавляют:
+    он и так прочитает каталог уже после их изменений.
+    """
+    if not settings.CATALOG_SNAPSHOTS:
+        return
+    transaction.on_commit(_flush_catalog_export)
+
+
+def _flush_catalog_export():
+    if _export_queued.is_set():
+        return
+    _export_queued.set()
+    _executor.submit(_export_catalog_job)
+
+
+def _export_catalog_job():
+    _export_queued.clear()
+    try:
+        export_catalog()
+    finally:
+        connections.close_all()
@@ -0,0 +1,661 @@
+import json
+import os
+import time
+from decimal import Decimal
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from locations import geodata
+from locations.backends import GeocoderError
+from locations.models import Location
+
+from .capabilities import ProductCapabilityIndex
+from . import candidates, catalog, geocoding, snapshots
+from .geocoding import geocode_orders, schedule_order_geocoding_retry
+from .generations import get_generation
+from .models import (
+    Order,
+    OrderCandidate,
+    OrderItems,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+
+
+class ProductCapabilityIndexTest(TestCase):
+    def setUp(self):
+        self.index = ProductCapabilityIndex([
+            (1, 10), (1, 11), (1, 12),
+            (2, 10), (2, 12),
+            (3, 11),
+        ])
+
+    def test_restaurants_for_basket(self):
+        self.assertEqual(self.index.restaurants_for([10, 12]), [1, 2])
+        self.assertEqual(self.index.restaurants_for([11]), [1, 3])
+        self.assertEqual(self.index.restaurants_for([10, 11, 12]), [1])
+
+    def test_empty_basket_fits_every_restaurant(self):
+        self.assertEqual(self.index.restaurants_for([]), [1, 2, 3])
+
+    def test_unknown_product_fits_nobody(self):
+        self.assertIsNone(self.index.basket_mask([10, 99]))
+        self.assertEqual(self.index.restaurants_for([10, 99]), [])
+        self.assertFalse(self.index.can_cook(1, None))
+
+    def test_unknown_restaurant_cannot_cook(self):
+        self.assertFalse(self.index.can_cook(42, self.index.basket_mask([10])))
+
+    def test_build_uses_only_available_menu_items(self):
+        restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Адрес {number}')
+            for number in range(2)
+        ]
+        product = Product.objects.create(name='Товар', price=100)
+        RestaurantMenuItem.objects.create(restaurant=restaurants[0], product=product)
+        RestaurantMenuItem.objects.create(
+            restaurant=restaurants[1], product=product, availability=False,
+        )
+        index = ProductCapabilityIndex.build()
+        self.assertEqual(index.restaurants_for([product.pk]), [restaurants[0].pk])
+
+class ProductAvailabilityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Адрес {number}')
+            for number in range(2)
+        ]
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.products = [
+            Product.objects.create(name=f'Товар {number}', price=100, category=category)
+            for number in range(3)
+        ]
+
+    def assertCounts(self, expected):
+        counts = list(
+            Product.objects.order_by('pk').values_list('available_restaurants_count', flat=True)
+        )
+        self.assertEqual(counts, expected)
+
+    def test_saving_loaded_product_keeps_count(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[0], product=product)
+        product.name = 'Новое название'
+        product.save()
+        self.assertCounts([1, 0, 0])
+        self.assertEqual(Product.objects.get(pk=product.pk).name, 'Новое название')
+
+    def test_save_and_delete(self):
+        first, second = self.restaurants
+        menu_item = RestaurantMenuItem.objects.create(restaurant=first, product=self.products[0])
+        RestaurantMenuItem.objects.create(restaurant=second, product=self.products[0])
+        self.assertCounts([2, 0, 0])
+
+        menu_item.availability = False
+        menu_item.save()
+        self.assertCounts([1, 0, 0])
+
+        menu_item.delete()
+        self.assertCounts([1, 0, 0])
+        self.assertEqual(list(Product.objects.available()), [self.products[0]])
+
+    def test_bulk_create_and_update(self):
+        first, second = self.restaurants
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=first, product=self.products[0]),
+            RestaurantMenuItem(restaurant=second, product=self.products[0]),
+            RestaurantMenuItem(restaurant=first, product=self.products[1]),
+        ])
+        self.assertCounts([2, 1, 0])
+
+        RestaurantMenuItem.objects.filter(availability=True, restaurant=first).update(
+            availability=False,
+        )
+        self.assertCounts([1, 0, 0])
+
+        RestaurantMenuItem.objects.filter(restaurant=second).update(product=self.products[2])
+        self.assertCounts([0, 0, 1])
+
+    def test_bulk_update_product_and_availability(self):
+        first, second = self.restaurants
+        menu_items = [
+            RestaurantMenuItem.objects.create(restaurant=first, product=self.products[0]),
+            RestaurantMenuItem.objects.create(restaurant=second, product=self.products[1]),
+        ]
+        menu_items[0].product = self.products[2]
+        menu_items[1].availability = False
+        RestaurantMenuItem.objects.bulk_update(menu_items, ['product', 'availability'])
+        self.assertCounts([0, 0, 1])
+
+        menu_items[1].product = self.products[0]
+        menu_items[1].availability = True
+        RestaurantMenuItem.objects.bulk_update(menu_items, ['product'])
+        RestaurantMenuItem.objects.bulk_update(menu_items, ['availability'])
+        self.assertCounts([1, 0, 1])
+
+
+class ProductListApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        restaurant = Restaurant.objects.create(name='Ресторан', address='Адрес')
+        categories = [ProductCategory.objects.create(name=f'Категория {number}') for number in range(2)]
+        for number in range(5):
+            product = Product.objects.create(
+                name=f'Товар {number}',
+                price=100,
+                category=categories[number % 2] if number < 4 else None,
+                image='product.jpg',
+            )
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+
+    def setUp(self):
+        cache.clear()
+        catalog._documents.clear()
+
+    def get_json(self, query=''):
+        response = self.client.get(f'/api/products/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_list(self):
+        products = self.get_json()
+        self.assertEqual(len(products), 5)
+        self.assertEqual(
+            list(products[0]),
+            ['id', 'name', 'price', 'special_status', 'description', 'category', 'image', 'restaurant'],
+        )
+
+    def test_pages_cover_catalog_once(self):
+        seen, cursor = [], None
+        while True:
+            page = self.get_json('?limit=2&fields=id' + (f'&cursor={cursor}' if cursor else ''))
+            seen += [product['id'] for product in page['results']]
+            cursor = page['next']
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(Product.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+        # Товар без категории — в конце
+        self.assertIsNone(Product.objects.get(pk=seen[-1]).category)
+
+    def test_category_and_fields(self):
+        category = ProductCategory.objects.first()
+        products = self.get_json(f'?category={category.pk}&fields=name,category')
+        self.assertEqual(len(products), 2)
+        self.assertEqual(list(products[0]), ['name', 'category'])
+        self.assertEqual(products[0]['category']['id'], category.pk)
+
+    def test_bad_parameters(self):
+        for query in [
+            '?category=x',
+            '?category=²',
+            '?limit=²',
+            '?limit=0',
+            '?fields=unknown',
+            '?fields=,',
+            '?cursor=broken',
+        ]:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/products/{query}').status_code, 400)
+
+    def test_cursor_pages_are_not_cached(self):
+        cursor = self.get_json('?limit=2')['next']
+        with mock.patch('foodcartapp.catalog.cache') as catalog_cache:
+            self.get_json(f'?limit=2&cursor={cursor}')
+        catalog_cache.set.assert_not_called()
+
+    def test_variants_are_built_once(self):
+        for query in ['', '?category=1&fields=id,name', '?limit=2']:
+            with self.subTest(query=query):
+                with mock.patch('foodcartapp.catalog.gzip.compress', return_value=b'') as compress:
+                    for _ in range(3):
+                        self.client.get(f'/api/products/{query}')
+                self.assertEqual(compress.call_count, 1)
+
+    def test_shared_cache_keeps_built_document(self):
+        self.get_json('?fields=id')
+        catalog._documents.clear()
+        with mock.patch('foodcartapp.catalog.render_product_list') as render:
+            self.get_json('?fields=id')
+        render.assert_not_called()
+
+    def test_gzip_and_conditional_get(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip;q=0, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class GeocodeOrdersTest(TestCase):
+    def setUp(self):
+        geodata.coordinates_cache.local.clear()
+        cache.clear()
+        geodata.circuit_breaker._on_success()
+        patcher = mock.patch('locations.geodata._fetch_coordinates_from_api')
+        self.geocode = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('foodcartapp.geocoding.schedule_order_geocoding_retry')
+        self.schedule_retry = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+            address='Москва, Тверская 1',
+        )
+
+    def geocode_order(self):
+        geocode_orders([self.order.pk])
+        self.order.refresh_from_db()
+
+    def test_found_address(self):
+        self.geocode.return_value = (37.6, 55.7)
+        self.geocode_order()
+        self.assertEqual(self.order.geocode_status, Order.GEOCODE_OK)
+        self.assertEqual((self.order.lon, self.order.lat), (37.6, 55.7))
+        self.schedule_retry.assert_not_called()
+
+    def test_not_found_address_fails(self):
+        self.geocode.side_effect = GeocoderError(Location.FAILURE_NOT_FOUND)
+        self.geocode_order()
+        self.assertEqual(self.order.geocode_status, Order.GEOCODE_FAILED)
+        self.schedule_retry.assert_not_called()
+
+    def test_request_error_is_retried_after_backoff(self):
+        self.geocode.side_effect = GeocoderError(Location.FAILURE_REQUEST_ERROR)
+        self.geocode_order()
+        self.assertEqual(self.order.geocode_status, Order.GEOCODE_PENDING)
+
+        order_ids, delay = self.schedule_retry.call_args.args
+        self.assertEqual(order_ids, [self.order.pk])
+        self.assertAlmostEqual(delay, settings.GEOCODE_RETRY_BASE_DELAY, delta=5)
+
+    def test_open_circuit_is_retried_after_recovery(self):
+        with mock.patch.object(
+            type(geodata.circuit_breaker), 'is_open', new_callable=mock.PropertyMock,
+        ) as is_open:
+            is_open.return_value = True
+            self.geocode_order()
+
+        self.geocode.assert_not_called()
+        self.assertEqual(self.order.geocode_status, Order.GEOCODE_PENDING)
+        _, delay = self.schedule_retry.call_args.args
+        self.assertEqual(delay, settings.GEOCODE_CIRCUIT_RECOVERY_TIMEOUT)
+
+
+class OrderGeocodingRetryTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('foodcartapp.geocoding.threading.Timer')
+        self.timer = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.reset)
+        self.reset()
+
+    def reset(self):
+        geocoding._retry_timer = geocoding._retry_at = None
+        geocoding._retry_order_ids.clear()
+
+    def test_one_timer_for_the_earliest_retry(self):
+        schedule_order_geocoding_retry([1], 60)
+        schedule_order_geocoding_retry([2], 120)
+        self.assertEqual(self.timer.call_count, 1)
+
+        schedule_order_geocoding_retry([3], 10)
+        self.assertEqual(self.timer.call_count, 2)
+        self.timer.return_value.cancel.assert_called_once()
+        self.assertEqual(self.timer.call_args.args[0], 10)
+        self.assertEqual(geocoding._retry_order_ids, {1, 2, 3})
+
+    def test_flush_geocodes_pending_orders(self):
+        schedule_order_geocoding_retry([1, 2], 10)
+        with mock.patch.object(geocoding._executor, 'submit') as submit:
+            geocoding._flush_order_geocoding_retry()
+
+        job, order_ids = submit.call_args.args
+        self.assertIs(job, geocoding._retry_order_geocoding_job)
+        self.assertEqual(sorted(order_ids), [1, 2])
+        self.assertIsNone(geocoding._retry_timer)
+        self.assertEqual(geocoding._retry_order_ids, set())
+
+
+class GeocodeWarmTest(TestCase):
+    def setUp(self):
+        geodata.coordinates_cache.local.clear()
+        cache.clear()
+        geodata.circuit_breaker._on_success()
+        patcher = mock.patch('locations.geodata._fetch_coordinates_from_api')
+        self.geocode = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.geocode.return_value = (37.6, 55.7)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, 'checkpoint.json')
+        for number in range(3):
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Москва, Тверская {number}')
+
+    def warm(self, **options):
+        stdout = StringIO()
+        call_command('geocode_warm', checkpoint=self.checkpoint, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_open_circuit_leaves_addresses_for_next_run(self):
+        with mock.patch.object(
+            type(geodata.circuit_breaker), 'is_open', new_callable=mock.PropertyMock,
+        ) as is_open:
+            is_open.return_value = True
+            output = self.warm()
+        self.assertIn('недоступен, не запрашивали: 3', output)
+        self.assertEqual(Location.objects.filter(lon__isnull=False).count(), 0)
+
+        output = self.warm()
+        self.assertEqual(self.geocode.call_count, 3)
+        self.assertIn('Все адреса геокодированы', output)
+
+    def test_resumed_run_skips_geocoded_addresses(self):
+        self.warm(batch_size=2)
+        self.assertEqual(self.geocode.call_count, 3)
+        with open(self.checkpoint, 'w') as checkpoint_file:
+            json.dump({'stats': {'requested': 3, 'skipped': 5}}, checkpoint_file)
+
+        output = self.warm()
+        self.assertEqual(self.geocode.call_count, 3)
+        self.assertIn('уже запрошено адресов 3', output)
+        self.assertIn('ждущих повтора, не запрашивали: 3', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class RestaurantCandidatesRefreshTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('foodcartapp.signals.schedule_candidates_refresh')
+        self.schedule_refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.restaurant = Restaurant.objects.create(name='Ресторан', address='Адрес')
+        self.schedule_refresh.reset_mock()
+
+    def test_name_and_phone_changes_keep_candidates(self):
+        restaurant = Restaurant.objects.get()
+        restaurant.name = 'Новое название'
+        restaurant.contact_phone = '+79001234567'
+        restaurant.save()
+        Restaurant.objects.only('name').get().save()
+        self.restaurant.save(update_fields=['name'])
+        self.schedule_refresh.assert_not_called()
+
+    def test_coordinates_change_refreshes_candidates(self):
+        restaurant = Restaurant.objects.get()
+        restaurant.lon, restaurant.lat = 37.6, 55.7
+        restaurant.save()
+        self.assertEqual(self.schedule_refresh.call_count, 1)
+
+        restaurant.save()
+        self.assertEqual(self.schedule_refresh.call_count, 1)
+
+    def test_new_restaurant_with_coordinates_refreshes_candidates(self):
+        Restaurant.objects.create(name='Другой', address='Адрес 2', lon=37.6, lat=55.7)
+        self.schedule_refresh.assert_called_once()
+
+
+class OrderCandidatesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.burger = Product.objects.create(name='Бургер', price=100)
+        cls.fries = Product.objects.create(name='Картофель', price=50)
+        cls.near, cls.middle, cls.far = [
+            Restaurant.objects.create(name=name, address=name, lon=37.6 + offset, lat=55.7)
+            for name, offset in [('Рядом', 0.01), ('Дальше', 0.05), ('Далеко', 0.2)]
+        ]
+        cls.no_coords = Restaurant.objects.create(name='Без координат', address='Нигде')
+        for restaurant in [cls.near, cls.middle, cls.far, cls.no_coords]:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=cls.burger)
+        for restaurant in [cls.middle, cls.far]:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=cls.fries)
+
+    def create_order(self, products, **kwargs):
+        order = Order.objects.create(**{
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 1',
+            'lon': 37.6,
+            'lat': 55.7,
+            **kwargs,
+        })
+        for product in products:
+            OrderItems.objects.create(order=order, product=product, price=product.price)
+        return order
+
+    def candidates(self, order):
+        return [
+            candidate.restaurant
+            for candidate in OrderCandidate.objects.filter(order=order).order_by('distance')
+        ]
+
+    def test_nearest_restaurants_that_can_cook(self):
+        burger_order = self.create_order([self.burger])
+        full_order = self.create_order([self.burger, self.fries])
+        candidates.refresh_order_candidates([burger_order.pk, full_order.pk])
+
+        self.assertEqual(self.candidates(burger_order), [self.near, self.middle, self.far])
+        self.assertEqual(self.candidates(full_order), [self.middle, self.far])
+        distance = OrderCandidate.objects.get(order=burger_order, restaurant=self.near).distance
+        self.assertAlmostEqual(distance, 0.63, delta=0.01)
+
+    @override_settings(ORDER_CANDIDATES_LIMIT=1)
+    def test_limit(self):
+        order = self.create_order([self.burger])
+        candidates.refresh_order_candidates([order.pk])
+        self.assertEqual(self.candidates(order), [self.near])
+
+    def test_refresh_replaces_candidates(self):
+        order = self.create_order([self.burger])
+        candidates.refresh_order_candidates([order.pk])
+
+        RestaurantMenuItem.objects.filter(restaurant=self.near).update(availability=False)
+        candidates.refresh_order_candidates([order.pk])
+        self.assertEqual(self.candidates(order), [self.middle, self.far])
+
+    def test_orders_without_coordinates_or_finished_get_none(self):
+        no_coords = self.create_order([self.burger], lon=None, lat=None)
+        finished = self.create_order([self.burger], status=Order.STATUS_FINISHED)
+        candidates.refresh_order_candidates([no_coords.pk, finished.pk])
+        self.assertFalse(OrderCandidate.objects.exists())
+
+    def test_refreshes_in_batches(self):
+        orders = [self.create_order([self.burger]) for _ in range(3)]
+        with mock.patch('foodcartapp.candidates.REFRESH_BATCH_SIZE', 2), \
+                mock.patch(
+                    'foodcartapp.candidates._refresh_candidates_batch',
+                    wraps=candidates._refresh_candidates_batch,
+                ) as refresh_batch:
+            candidates.refresh_order_candidates([order.pk for order in orders])
+
+        self.assertEqual(refresh_batch.call_count, 2)
+        for order in orders:
+            self.assertEqual(self.candidates(order), [self.near, self.middle, self.far])
+
+    def test_scheduled_refresh_runs_once_after_commit(self):
+        with mock.patch.object(candidates._executor, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                candidates.schedule_candidates_refresh([1, 2])
+                candidates.schedule_candidates_refresh([2, 3])
+
+        submit.assert_called_once_with(candidates._refresh_candidates_job, {1, 2, 3})
+
+
+class OrderTotalCostTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(name='Бургер', price=100)
+        self.fries = Product.objects.create(name='Картофель', price=50)
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+            address='Москва, Тверская 1',
+        )
+
+    def total_cost(self):
+        self.order.refresh_from_db()
+        return self.order.total_cost
+
+    def test_follows_order_items(self):
+        item = OrderItems.objects.create(order=self.order, product=self.burger, price=100, quantity=2)
+        OrderItems.objects.create(order=self.order, product=self.fries, price=Decimal('49.50'))
+        self.assertEqual(self.total_cost(), Decimal('249.50'))
+
+        item.quantity = 3
+        item.save()
+        self.assertEqual(self.total_cost(), Decimal('349.50'))
+
+        item.delete()
+        self.assertEqual(self.total_cost(), Decimal('49.50'))
+
+    def test_price_change_does_not_touch_existing_orders(self):
+        OrderItems.objects.create(order=self.order, product=self.burger, price=100)
+        self.burger.price = 200
+        self.burger.save()
+        self.assertEqual(self.total_cost(), Decimal('100'))
+
+    def test_check_order_totals(self):
+        OrderItems.objects.create(order=self.order, product=self.burger, price=100)
+        stdout = StringIO()
+        call_command('check_order_totals', stdout=stdout)
+        self.assertIn('Расхождений нет', stdout.getvalue())
+
+        Order.objects.filter(pk=self.order.pk).update(total_cost=1)
+        stdout = StringIO()
+        call_command('check_order_totals', stdout=stdout)
+        self.assertIn(f'Заказ {self.order.pk}: сохранено 1.00', stdout.getvalue())
+        self.assertIn('Расходящихся заказов: 1', stdout.getvalue())
+        self.assertEqual(self.total_cost(), Decimal('1'))
+
+        call_command('check_order_totals', fix=True, stdout=StringIO())
+        self.assertEqual(self.total_cost(), Decimal('100'))
+
+
+class CatalogInvalidationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog._documents.clear()
+        patcher = mock.patch('foodcartapp.signals.schedule_catalog_export')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        restaurant = Restaurant.objects.create(name='Ресторан', address='Адрес')
+        self.product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.menu_item = RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.product)
+
+    def get_names(self):
+        response = self.client.get('/api/products/?fields=name')
+        return [product['name'] for product in response.json()], response['ETag']
+
+    def test_product_save_invalidates_after_commit(self):
+        names, etag = self.get_names()
+        self.assertEqual(names, ['Бургер'])
+
+        generation = get_generation(catalog.CATALOG_GENERATION)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Чизбургер'
+            self.product.save()
+            # До коммита поколение прежнее: новое не должно закэшировать старый каталог
+            self.assertEqual(get_generation(catalog.CATALOG_GENERATION), generation)
+
+        names, new_etag = self.get_names()
+        self.assertEqual(names, ['Чизбургер'])
+        self.assertNotEqual(new_etag, etag)
+
+    def test_menu_item_save_invalidates(self):
+        self.assertEqual(self.get_names()[0], ['Бургер'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.availability = False
+            self.menu_item.save()
+        self.assertEqual(self.get_names()[0], [])
+
+    def test_bulk_menu_update_invalidates(self):
+        self.assertEqual(self.get_names()[0], ['Бургер'])
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.update(availability=False)
+        self.assertEqual(self.get_names()[0], [])
+
+
+class CatalogSnapshotsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog._documents.clear()
+        snapshots._manifest_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(STATIC_ROOT=directory.name, CATALOG_SNAPSHOTS=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.snapshot_dir = os.path.join(directory.name, snapshots.SNAPSHOT_DIR)
+
+        restaurant = Restaurant.objects.create(name='Ресторан', address='Адрес')
+        self.product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.product)
+
+    def read_snapshot(self, url):
+        with open(os.path.join(self.snapshot_dir, url.rsplit('/', 1)[-1]), 'rb') as file:
+            return file.read()
+
+    def test_manifest_points_to_current_snapshots(self):
+        manifest = snapshots.export_catalog()
+
+        self.assertTrue(manifest['products'].startswith('/static/catalog/products.'))
+        self.assertEqual(self.read_snapshot(manifest['products']), catalog.render_product_list())
+        self.assertEqual(json.loads(self.read_snapshot(manifest['banners'])), catalog.dump_banners())
+        self.assertEqual(snapshots.read_manifest(), manifest)
+        self.assertFalse([name for name in os.listdir(self.snapshot_dir) if name.startswith('.tmp-')])
+
+    def test_manifest_is_read_once_per_export(self):
+        snapshots.export_catalog()
+        with mock.patch(
+            'foodcartapp.snapshots._load_manifest', wraps=snapshots._load_manifest,
+        ) as load_manifest:
+            snapshots.read_manifest()
+            snapshots.read_manifest()
+            self.assertEqual(load_manifest.call_count, 1)
+
+            manifest = snapshots.export_catalog()
+            self.assertEqual(snapshots.read_manifest(), manifest)
+            self.assertEqual(load_manifest.call_count, 3)
+
+    def test_cleanup_keeps_previous_and_young_files(self):
+        first = snapshots.export_catalog()
+        Product.objects.filter(pk=self.product.pk).update(name='Чизбургер')
+        second = snapshots.export_catalog()
+        Product.objects.filter(pk=self.product.pk).update(name='Двойной')
+        # Снимок из первого экспорта уже старый, а этот записал параллельный экспорт
+        old_time = time.time() - snapshots.SNAPSHOT_GRACE_PERIOD - 1
+        first_products = os.path.join(self.snapshot_dir, first['products'].rsplit('/', 1)[-1])
+        os.utime(first_products, (old_time, old_time))
+        orphan = os.path.join(self.snapshot_dir, 'products.0123456789ab.json')
+        with open(orphan, 'w') as file:
+            file.write('[]')
+
+        third = snapshots.export_catalog()
+
+        self.assertFalse(os.path.exists(first_products))
+        self.assertTrue(os.path.exists(orphan))
+        # Предыдущий снимок остаётся для уже открытых страниц
+        self.assertEqual(json.loads(self.read_snapshot(second['products']))[0]['name'], 'Чизбургер')
+        self.assertEqual(json.loads(self.read_snapshot(third['products']))[0]['name'], 'Двойной')
+
+    def test_export_is_queued_once_after_commit(self):
+        snapshots._export_queued.clear()
+        self.addCleanup(snapshots._export_queued.clear)
+        with mock.patch.object(snapshots._executor, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                snapshots.schedule_catalog_export()
+                snapshots.schedule_catalog_export()
+        submit.assert_called_once_with(snapshots._export_catalog_job)
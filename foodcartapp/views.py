@@ -1,60 +1,117 @@
-from django.templatetags.static import static
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from star_burger.cursors import InvalidCursor
 
-from .models import Product
+from .catalog import (
+    PRODUCT_FIELDS,
+    get_banners,
+    get_product_list,
+    normalize_product_fields,
+)
 from .serializers import OrderSerializer
 
 
-@api_view(['GET'])
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Разрешает ли `Accept-Encoding` gzip, с учётом `q=0` и `*`."""
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, *params = coding.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def json_bytes_response(request, document):
+    """Отдаёт заранее закодированный JSON, при возможности сжатым."""
+    use_gzip = (
+        settings.CATALOG_GZIP
+        and accepts_gzip(request.headers.get('Accept-Encoding', ''))
+    )
+    etag = document.gzip_etag if use_gzip else document.etag
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(document.last_modified),
+    )
+    if response is None:
+        if use_gzip:
+            response = HttpResponse(document.gzipped, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(document.body, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(document.last_modified)
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@require_GET
 def banners_list_api(request):
-    banners = [
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ]
-    return Response(banners)
-
-
-@api_view(['GET'])
+    return json_bytes_response(request, get_banners())
+
+
+@require_GET
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-
-    return Response(dumped_products)
+    """Товары в продаже.
+
+    `?category=<id>` оставляет товары одной категории, `?fields=name,price`
+    — только перечисленные поля. С `?limit=` или `?cursor=` ответ разбит на
+    страницы: `{"results": [...], "next": "<курсор следующей страницы>"}`.
+    """
+    category_id = None
+    if 'category' in request.GET:
+        try:
+            category_id = int(request.GET['category'])
+        except ValueError:
+            return HttpResponseBadRequest('Некорректная категория')
+
+    fields = tuple(PRODUCT_FIELDS)
+    if 'fields' in request.GET:
+        try:
+            fields = normalize_product_fields(
+                [field for field in request.GET['fields'].split(',') if field]
+            )
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+        if not fields:
+            return HttpResponseBadRequest('Не указаны поля')
+
+    cursor = request.GET.get('cursor') or None
+    page_size = None
+    if 'limit' in request.GET:
+        try:
+            page_size = int(request.GET['limit'])
+        except ValueError:
+            return HttpResponseBadRequest('Некорректный limit')
+        if not 1 <= page_size <= settings.CATALOG_PAGE_SIZE:
+            return HttpResponseBadRequest('Некорректный limit')
+    elif 'cursor' in request.GET:
+        page_size = settings.CATALOG_PAGE_SIZE
+
+    try:
+        document = get_product_list(category_id, fields, cursor, page_size)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный курсор')
+    return json_bytes_response(request, document)
 
 
 @api_view(['POST'])
@@ -1,3 +1,60 @@
 from django.contrib import admin
+from django.utils import timezone
 
-# Register your models here.
+from .models import Location
+
+
+class GeocodeStatusFilter(admin.SimpleListFilter):
+    title = 'геокодирование'
+    parameter_name = 'geocode_status'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('ok', 'координаты найдены'),
+            ('failed', 'с ошибкой'),
+            ('waiting', 'ждут повторной попытки'),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'ok':
+            return queryset.filter(failure_reason='', lon__isnull=False, lat__isnull=False)
+        if self.value() == 'failed':
+            return queryset.exclude(failure_reason='')
+        if self.value() == 'waiting':
+            return queryset.filter(next_retry_at__gt=timezone.now())
+        return queryset
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = [
+        'address',
+        'lon',
+        'lat',
+        'updated_at',
+        'failure_reason',
+        'failed_attempts',
+        'next_retry_at',
+    ]
+    list_filter = [
+        GeocodeStatusFilter,
+        'failure_reason',
+    ]
+    search_fields = [
+        'address',
+        'canonical_address',
+    ]
+    readonly_fields = [
+        'canonical_address',
+        'updated_at',
+        'failure_reason',
+        'failed_attempts',
+        'next_retry_at',
+    ]
+
+    def save_model(self, request, obj, form, change):
+        if obj.lon is not None and obj.lat is not None:
+            obj.failure_reason = ''
+            obj.failed_attempts = 0
+            obj.next_retry_at = None
+        super().save_model(request, obj, form, change)
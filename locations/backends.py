@@ -0,0 +1,306 @@
+"""Бэкенды геокодера.
+
+Бэкенд выбирается настройкой `GEOCODER`: путь к классу в `BACKEND` и
+аргументы конструктора в `OPTIONS`. Метод `geocode` возвращает пару
+`(lon, lat)` или бросает `GeocoderError` с одной из причин `Location.FAILURE_*`.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import Location
+from .normalization import canonicalize_address
+
+
+class GeocoderError(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class BaseGeocoder(ABC):
+    @abstractmethod
+    def geocode(self, address: str):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class _SharedPoolAdapter(HTTPAdapter):
+    """Адаптер, который ходит через общий для всех потоков пул соединений."""
+
+    def __init__(self, poolmanager, **kwargs):
+        self.shared_poolmanager = poolmanager
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = self.shared_poolmanager
+
+
+class YandexGeocoder(BaseGeocoder):
+    """HTTP API Яндекс-геокодера.
+
+    `requests.Session` не обещает потокобезопасности, поэтому сессия у
+    каждого потока своя, а общий у них только пул keep-alive соединений
+    urllib3 на `pool_size` штук. Ответы 429 и 5xx, а также
+    ошибки соединения повторяются до `max_retries` раз с паузой
+    `retry_backoff * 2**n` со случайным разбросом; `Retry-After` учитывается.
+    """
+
+    base_url = 'https://geocode-maps.yandex.ru/1.x'
+    retry_statuses = {429, 500, 502, 503, 504}
+    max_retry_delay = 10
+
+    def __init__(
+        self,
+        apikey=None,
+        pool_size=None,
+        connect_timeout=3.05,
+        read_timeout=5,
+        max_retries=2,
+        retry_backoff=0.5,
+    ):
+        self.apikey = apikey or settings.GEOCODE_APIKEY
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        pool_size = pool_size or settings.GEOCODE_MAX_WORKERS
+        self.poolmanager = PoolManager(num_pools=1, maxsize=pool_size, block=True)
+        self.local = threading.local()
+
+        self.stats_lock = threading.Lock()
+        self.counters = {
+            'attempts': 0,
+            'retries': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+
+    def _record_attempt(self, latency, retry):
+        with self.stats_lock:
+            self.counters['attempts'] += 1
+            self.counters['retries'] += retry
+            self.counters['latency_total'] += latency
+            self.counters['latency_max'] = max(self.counters['latency_max'], latency)
+
+    def _retry_delay(self, attempt, response):
+        delay = random.uniform(0, self.retry_backoff * 2 ** attempt)
+        retry_after = response is not None and response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        return min(delay, self.max_retry_delay)
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            session.mount('https://', _SharedPoolAdapter(self.poolmanager, max_retries=0))
+        return session
+
+    def _get(self, params):
+        for attempt in range(self.max_retries + 1):
+            response = None
+            started_at = time.monotonic()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                self._record_attempt(time.monotonic() - started_at, retry=attempt > 0)
+
+            if response is not None and (
+                response.status_code not in self.retry_statuses
+                or attempt == self.max_retries
+            ):
+                return response
+            time.sleep(self._retry_delay(attempt, response))
+
+    def geocode(self, address: str):
+        try:
+            raw_response = self._get({
+                'geocode': address,
+                'apikey': self.apikey,
+                'format': 'json',
+            })
+            raw_response.raise_for_status()
+            response = raw_response.json()
+        except (requests.RequestException, ValueError):
+            raise GeocoderError(Location.FAILURE_REQUEST_ERROR)
+
+        try:
+            members = response['response']['GeoObjectCollection']['featureMember']
+            if not members:
+                raise GeocoderError(Location.FAILURE_NOT_FOUND)
+            point = members[0]['GeoObject']['Point']['pos']
+            lon_str, lat_str = point.split()
+            return float(lon_str), float(lat_str)
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise GeocoderError(Location.FAILURE_BAD_RESPONSE)
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            stats = dict(self.counters)
+        pools = self.poolmanager.pools
+        connections = requests_sent = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+        stats['connections_opened'] = connections
+        stats['connections_reused'] = max(requests_sent - connections, 0)
+        stats['latency_avg'] = (
+            stats['latency_total'] / stats['attempts'] if stats['attempts'] else 0.0
+        )
+        return stats
+
+
+class FileGeocoder(BaseGeocoder):
+    """Геокодер без сети для разработки и нагрузочных тестов.
+
+    Координаты берутся из JSON-файла `{"адрес": [lon, lat]}`, адреса
+    сравниваются в нормализованном виде. Адресам, которых нет в файле, при
+    `generate_missing` выдаются постоянные псевдослучайные координаты внутри
+    `bbox`, иначе они считаются ненайденными. `latency` — искусственная
+    задержка ответа в секундах.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        generate_missing=True,
+        bbox=(37.35, 55.57, 37.85, 55.91),
+        latency=0,
+    ):
+        self.coordinates = {}
+        if path:
+            with open(path, encoding='utf-8') as file:
+                self.coordinates = {
+                    canonicalize_address(address): tuple(coords) if coords else None
+                    for address, coords in json.load(file).items()
+                }
+        self.generate_missing = generate_missing
+        self.bbox = bbox
+        self.latency = latency
+
+    def geocode(self, address: str):
+        if self.latency:
+            time.sleep(self.latency)
+
+        canonical_address = canonicalize_address(address)
+        if canonical_address in self.coordinates:
+            coords = self.coordinates[canonical_address]
+            if coords is None:
+                raise GeocoderError(Location.FAILURE_NOT_FOUND)
+            return coords
+        if not self.generate_missing:
+            raise GeocoderError(Location.FAILURE_NOT_FOUND)
+
+        digest = hashlib.sha1(canonical_address.encode()).digest()
+        x = int.from_bytes(digest[:4], 'big') / 2 ** 32
+        y = int.from_bytes(digest[4:8], 'big') / 2 ** 32
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        return min_lon + x * (max_lon - min_lon), min_lat + y * (max_lat - min_lat)
+
+
+class CircuitBreaker:
+    """Перестаёт обращаться к геокодеру, пока тот не отвечает.
+
+    После `failure_threshold` ошибок подряд цепь размыкается и вызовы сразу
+    бросают `CircuitOpenError`. Через `recovery_timeout` секунд один вызов
+    пропускается как проба: удачный замыкает цепь, неудачный снова размыкает.
+    Ошибки из `ignored_reasons` — нормальный ответ геокодера, а не сбой.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, recovery_timeout, ignored_reasons=()):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.ignored_reasons = set(ignored_reasons)
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        with self.lock:
+            return (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at < self.recovery_timeout
+            )
+
+    def _before_call(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            recovered = time.monotonic() - self.opened_at >= self.recovery_timeout
+            if self.state == self.OPEN and recovered:
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError()
+
+    def _on_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def _on_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, function, *args, **kwargs):
+        self._before_call()
+        try:
+            result = function(*args, **kwargs)
+        except GeocoderError as error:
+            if error.reason in self.ignored_reasons:
+                self._on_success()
+            else:
+                self._on_failure()
+            raise
+        except Exception:
+            self._on_failure()
+            raise
+        self._on_success()
+        return result
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder() -> BaseGeocoder:
+    global _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            backend = import_string(settings.GEOCODER['BACKEND'])
+            _geocoder = backend(**settings.GEOCODER.get('OPTIONS', {}))
+        return _geocoder
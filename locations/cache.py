@@ -0,0 +1,132 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class CoordinatesCache:
+    """Кэш свежих координат перед таблицей Location.
+
+    Первый уровень — LRU в памяти процесса, второй — кэш Django из настройки
+    GEOCODE_CACHE_ALIAS. Запись живёт не дольше, чем координаты остаются
+    свежими. Инвалидация чистит оба уровня, но только в своём процессе:
+    в других процессах запись доживает до GEOCODE_LOCAL_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self.local = LRUCache(
+            maxsize=settings.GEOCODE_LOCAL_CACHE_SIZE,
+            ttl=settings.GEOCODE_LOCAL_CACHE_TTL,
+        )
+        self.stats_lock = threading.Lock()
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @property
+    def shared(self):
+        return caches[settings.GEOCODE_CACHE_ALIAS]
+
+    @staticmethod
+    def _shared_key(address):
+        return 'geocode:' + hashlib.sha1(address.encode()).hexdigest()
+
+    def _count(self, counter, value=1):
+        with self.stats_lock:
+            self.counters[counter] += value
+
+    def get_many(self, addresses) -> dict:
+        found = {}
+        for address in addresses:
+            coords = self.local.get(address)
+            if coords is not None:
+                found[address] = coords
+        self._count('local_hits', len(found))
+
+        missing = [address for address in addresses if address not in found]
+        if missing:
+            keys = {self._shared_key(address): address for address in missing}
+            now = time.time()
+            shared_hits = 0
+            for key, (coords, expires_at) in self.shared.get_many(keys).items():
+                if expires_at <= now:
+                    continue
+                address = keys[key]
+                self.local.set(address, coords, ttl=expires_at - now)
+                found[address] = coords
+                shared_hits += 1
+            self._count('shared_hits', shared_hits)
+
+        self._count('misses', len(addresses) - len(found))
+        return found
+
+    def get(self, address):
+        return self.get_many([address]).get(address)
+
+    def set_many(self, entries):
+        """Кладёт координаты в оба уровня: `{address: (coords, expires_at)}`."""
+        now = time.time()
+        entries = {
+            address: (coords, expires_at)
+            for address, (coords, expires_at) in entries.items()
+            if expires_at > now
+        }
+        if not entries:
+            return
+        for address, (coords, expires_at) in entries.items():
+            self.local.set(address, coords, ttl=expires_at - now)
+        self.shared.set_many(
+            {self._shared_key(address): entry for address, entry in entries.items()},
+            timeout=max(expires_at for _, expires_at in entries.values()) - now,
+        )
+
+    def set(self, address, coords, expires_at):
+        self.set_many({address: (coords, expires_at)})
+
+    def invalidate(self, address):
+        self.local.delete(address)
+        self.shared.delete(self._shared_key(address))
+
+    def clear_local(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            return dict(self.counters)
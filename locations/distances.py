@@ -0,0 +1,153 @@
+"""Пакетный расчёт расстояний между точками.
+
+Координаты передаются в том же виде, что возвращает `fetch_coordinates`:
+пары `(lon, lat)` в градусах, `None` — координаты неизвестны. Результат
+в километрах, для неизвестных координат — `nan`.
+
+Метрики и их точность:
+
+- `geodesic` — обратная задача Винсенти на эллипсоиде WGS-84. Расхождение
+  с `geopy.distance.geodesic` (алгоритм Карни) не больше 1 мм. Для почти
+  антиподальных точек, где итерации не сходятся, расстояние досчитывается
+  через geopy.
+- `haversine` — сфера среднего радиуса 6371.0088 км. Ошибка относительно
+  эллипсоида до 0.5%, на масштабе города — порядка 0.3%.
+- `equirectangular` — плоская проекция со средней широтой пары. На
+  расстояниях до 100 км добавляет к ошибке haversine не больше 0.1%,
+  дальше быстро деградирует. Самая дешёвая метрика.
+"""
+import numpy as np
+from geopy.distance import geodesic
+
+EARTH_RADIUS_KM = 6371.0088
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B_KM = WGS84_A_KM * (1 - WGS84_F)
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+METRICS = ('geodesic', 'haversine', 'equirectangular')
+
+
+def _to_radians(points):
+    lon_lat = np.full((len(points), 2), np.nan)
+    for index, point in enumerate(points):
+        if point is not None:
+            lon_lat[index] = point
+    return np.radians(lon_lat[:, 1]), np.radians(lon_lat[:, 0])
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    hav = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+
+
+def _equirectangular(lat1, lon1, lat2, lon2):
+    dlon = (lon2 - lon1 + np.pi) % (2 * np.pi) - np.pi
+    x = dlon * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+
+def _geodesic(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(lat1, lon1, lat2, lon2)
+    f = WGS84_F
+    u1 = np.arctan((1 - f) * np.tan(lat1))
+    u2 = np.arctan((1 - f) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    delta_lon = lon2 - lon1
+    lam = delta_lon
+    converged = np.zeros(lam.shape, dtype=bool)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(
+                cos_u2 * sin_lam,
+                cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam,
+            )
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(
+                sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma
+            )
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(
+                cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+            )
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous_lam = lam
+            lam = delta_lon + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (
+                    cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                )
+            )
+            converged = np.abs(lam - previous_lam) < VINCENTY_TOLERANCE
+            if np.all(converged | np.isnan(lam)):
+                break
+
+        u_sq = cos2_alpha * (WGS84_A_KM ** 2 - WGS84_B_KM ** 2) / WGS84_B_KM ** 2
+        a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = b * sin_sigma * (
+            cos_2sigma_m + b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2)
+                * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        distances = WGS84_B_KM * a * (sigma - delta_sigma)
+
+    diverged = ~converged & ~np.isnan(lam)
+    for index in zip(*np.nonzero(diverged)):
+        distances[index] = geodesic(
+            np.degrees((lat1[index], lon1[index])),
+            np.degrees((lat2[index], lon2[index])),
+        ).km
+    return distances
+
+
+_METRIC_FUNCTIONS = {
+    'geodesic': _geodesic,
+    'haversine': _haversine,
+    'equirectangular': _equirectangular,
+}
+
+
+def _get_metric_function(metric):
+    if metric not in _METRIC_FUNCTIONS:
+        raise ValueError(f'Unknown metric {metric!r}, expected one of {METRICS}')
+    return _METRIC_FUNCTIONS[metric]
+
+
+def distance_matrix(origins, destinations, metric='geodesic') -> np.ndarray:
+    metric_function = _get_metric_function(metric)
+
+    lat1, lon1 = _to_radians(origins)
+    lat2, lon2 = _to_radians(destinations)
+    if not len(lat1) or not len(lat2):
+        return np.empty((len(lat1), len(lat2)))
+
+    return metric_function(
+        lat1[:, np.newaxis], lon1[:, np.newaxis],
+        lat2[np.newaxis, :], lon2[np.newaxis, :],
+    )
+
+
+def paired_distances(origins, destinations, metric='geodesic') -> np.ndarray:
+    metric_function = _get_metric_function(metric)
+    if len(origins) != len(destinations):
+        raise ValueError('origins and destinations must have the same length')
+
+    lat1, lon1 = _to_radians(origins)
+    lat2, lon2 = _to_radians(destinations)
+    if not len(lat1):
+        return np.empty(0)
+
+    return metric_function(lat1, lon1, lat2, lon2)
@@ -1,65 +1,536 @@
-import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
-import requests
 from django.conf import settings
+from django.db import connections
+from django.db.models import Q
 from django.utils import timezone
 from geopy.distance import distance
 
-from .models import Location
+from .backends import CircuitBreaker, CircuitOpenError, GeocoderError, get_geocoder
+from .cache import CoordinatesCache
+from .models import Location, locations_saved
+from .normalization import canonicalize_address
+from .singleflight import SingleFlight
+
+COORDINATES_TTL = timedelta(seconds=settings.GEOCODE_SOFT_TTL)
+COORDINATES_HARD_TTL = timedelta(seconds=settings.GEOCODE_HARD_TTL)
+# Сколько держится метка «адрес геокодируется» и сколько её ждут другие
+# процессы. Метка переживает все повторы запроса к геокодеру.
+GEOCODING_CLAIM_TIMEOUT = timedelta(seconds=60)
+GEOCODING_CLAIM_WAIT = 10
+GEOCODING_CLAIM_POLL_INTERVAL = 0.2
+
+coordinates_cache = CoordinatesCache()
+
+_lookups = SingleFlight()
+
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=settings.GEOCODE_REFRESH_WORKERS,
+    thread_name_prefix='geocode-refresh',
+)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.GEOCODE_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=settings.GEOCODE_CIRCUIT_RECOVERY_TIMEOUT,
+    ignored_reasons=[Location.FAILURE_NOT_FOUND],
+)
 
 
 def _fetch_coordinates_from_api(address: str):
-    base_url = 'https://geocode-maps.yandex.ru/1.x'
+    return get_geocoder().geocode(address)
+
+
+def _geocode(address_text: str):
+    """Возвращает `(coords, failure_reason)`.
+
+    Пока цепь разомкнута, геокодер не вызывается и причина — `None`: адрес
+    не виноват, и его попытки не учитываются.
+    """
     try:
-        raw_response = requests.get(
-            base_url,
-            params={
-                'geocode': address,
-                'apikey': settings.GEOCODE_APIKEY,
-                'format': 'json',
-            },
-            timeout=5,
-        )
-        raw_response.raise_for_status()
-        response = raw_response.json()
-        members = response['response']['GeoObjectCollection']['featureMember']
-        if not members:
-            return None
-        point = members[0]['GeoObject']['Point']['pos']
-        lon_str, lat_str = point.split()
-        return float(lon_str), float(lat_str)
-    except (requests.RequestException, KeyError, ValueError):
+        return circuit_breaker.call(_fetch_coordinates_from_api, address_text), ''
+    except GeocoderError as error:
+        return None, error.reason
+    except CircuitOpenError:
+        return None, None
+
+
+def _apply_geocode_result(location, coords, failure_reason, now):
+    location.updated_at = now
+    if coords is not None:
+        location.lon, location.lat = coords
+        location.failure_reason = ''
+        location.failed_attempts = 0
+        location.next_retry_at = None
+        return
+
+    # Старые координаты не затираем: устаревшие лучше, чем никаких
+    location.failure_reason = failure_reason
+    location.failed_attempts += 1
+    backoff = min(
+        settings.GEOCODE_RETRY_BASE_DELAY * 2 ** (location.failed_attempts - 1),
+        settings.GEOCODE_RETRY_MAX_DELAY,
+    )
+    location.next_retry_at = now + timedelta(seconds=backoff)
+
+
+def _known_coords(location):
+    if location.lon is None or location.lat is None:
         return None
+    return location.lon, location.lat
 
 
 def fetch_coordinates(address: str):
     if not address:
         return None
 
-    address_text = address.strip()
-    if not address_text:
+    canonical_address = canonicalize_address(address)
+    if not canonical_address:
         return None
 
-    obj, created = Location.objects.get_or_create(address=address_text)
-    now = timezone.now()
-    month_ago = now - timedelta(days=30)
+    coords = coordinates_cache.get(canonical_address)
+    if coords is not None:
+        return coords
+
+    (coords, _, is_stale), _ = _lookups.do(
+        canonical_address, _lookup_coordinates, canonical_address, address.strip()
+    )
+    if is_stale:
+        # Уже вне single-flight: иначе фоновое обновление присоединится
+        # к этому же вызову и получит те же устаревшие координаты
+        schedule_coordinates_refresh(canonical_address, address.strip())
+    return coords
 
-    if obj.lon is not None and obj.lat is not None and obj.updated_at >= month_ago:
-        return obj.lon, obj.lat
 
-    coords = _fetch_coordinates_from_api(address_text)
+def _lookup_coordinates(canonical_address, address_text, revalidate=False):
+    """Ищет координаты в базе и при необходимости идёт в геокодер.
 
-    if coords is None:
-        obj.lon = None
-        obj.lat = None
-    else:
-        obj.lon, obj.lat = coords
+    Возвращает `(coords, failure_reason, is_stale)`. Устаревшие, но не
+    просроченные координаты отдаются сразу с `is_stale`, чтобы вызывающий
+    обновил их в фоне; с `revalidate` они обновляются сразу. Транзакцию на
+    время запроса к геокодеру не держим: строка Location сначала
+    помечается коротким UPDATE, и пока метка не истекла, другие процессы
+    ждут её результата, а не повторяют запрос.
+    """
+    obj, created = Location.objects.get_or_create(
+        canonical_address=canonical_address,
+        defaults={'address': address_text},
+    )
+    if not _needs_geocoding(obj, timezone.now()):
+        return _cached_or_known_coords(obj), '', False
+    if not revalidate and _is_usable_stale(obj, timezone.now()):
+        return _known_coords(obj), '', True
+
+    if not _claim_geocoding(obj):
+        return _wait_for_claim(obj)
+
+    obj.refresh_from_db()
+    now = timezone.now()
+    if not _needs_geocoding(obj, now):
+        _release_geocoding(obj)
+        return _cached_or_known_coords(obj), '', False
 
-    obj.updated_at = now
+    try:
+        coords, failure_reason = _geocode(obj.address)
+    except BaseException:
+        _release_geocoding(obj)
+        raise
+    if failure_reason is None:
+        _release_geocoding(obj)
+        return _known_coords(obj), None, False
+    _apply_geocode_result(obj, coords, failure_reason, now)
+    obj.geocoding_until = None
     obj.save()
 
-    return coords
+    if coords is not None:
+        coordinates_cache.set(canonical_address, coords, _expires_at(obj))
+    return _known_coords(obj), failure_reason, False
+
+
+def _claim_geocoding(location) -> bool:
+    now = timezone.now()
+    return bool(
+        Location.objects
+        .filter(pk=location.pk)
+        .filter(Q(geocoding_until__isnull=True) | Q(geocoding_until__lt=now))
+        .update(geocoding_until=now + GEOCODING_CLAIM_TIMEOUT)
+    )
+
+
+def _release_geocoding(location):
+    _release_geocoding_many([location])
+
+
+def _release_geocoding_many(locations):
+    pks = [location.pk for location in locations]
+    if pks:
+        Location.objects.filter(pk__in=pks).update(geocoding_until=None)
+
+
+def _wait_for_claim(location):
+    return (*_settled_result(_wait_for_geocoding(location)), False)
+
+
+def _wait_for_geocoding(location):
+    return _wait_for_geocoding_many([location])[0]
+
+
+def _wait_for_geocoding_many(locations) -> list:
+    """Ждёт, пока с адресов снимут метки, и возвращает их свежие строки."""
+    waiting = {location.pk: location for location in locations}
+    done = []
+    deadline = time.monotonic() + GEOCODING_CLAIM_WAIT
+    while waiting and time.monotonic() < deadline:
+        time.sleep(GEOCODING_CLAIM_POLL_INTERVAL)
+        now = timezone.now()
+        for location in Location.objects.filter(pk__in=waiting):
+            waiting[location.pk] = location
+            if location.geocoding_until is None or location.geocoding_until < now:
+                done.append(waiting.pop(location.pk))
+    return done + list(waiting.values())
+
+
+def schedule_coordinates_refresh(canonical_address, address_text):
+    """Обновляет координаты адреса в фоне, не больше одной задачи на адрес.
+
+    Обновление идёт через тот же single-flight, что и обычный поиск, так что
+    одновременно с ним тот же адрес в геокодер никто из процесса не отправит.
+    """
+    with _refreshing_lock:
+        if canonical_address in _refreshing:
+            return
+        _refreshing.add(canonical_address)
+    _refresh_executor.submit(_refresh_coordinates, canonical_address, address_text)
+
+
+def _refresh_coordinates(canonical_address, address_text):
+    try:
+        for _ in range(2):
+            _, shared = _lookups.do(
+                canonical_address,
+                _lookup_coordinates,
+                canonical_address,
+                address_text,
+                revalidate=True,
+            )
+            # Если присоединились к обычному поиску, он мог отдать те же
+            # устаревшие координаты, не обновив их: пробуем ещё раз
+            if not shared:
+                break
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(canonical_address)
+        connections.close_all()
+
+
+def _needs_geocoding(location, now) -> bool:
+    return not _is_fresh(location, now) and not _is_backing_off(location, now)
+
+
+def _cached_or_known_coords(location):
+    if _is_fresh(location, timezone.now()):
+        coordinates_cache.set(
+            location.canonical_address,
+            (location.lon, location.lat),
+            _expires_at(location),
+        )
+    return _known_coords(location)
+
+
+def fetch_coordinates_many(addresses, max_workers=None, requests_per_second=None) -> dict:
+    return {
+        address: coords
+        for address, (coords, _) in fetch_geocode_results_many(
+            addresses,
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+        ).items()
+    }
+
+
+def fetch_geocode_results_many(addresses, max_workers=None, requests_per_second=None) -> dict:
+    """Пары `(coords, failure_reason)` для адресов, как у `fetch_coordinates_many`.
+
+    Причина пустая, если адрес найден, и `None`, если геокодер не
+    спрашивали: цепь разомкнута или адрес геокодировал другой процесс и
+    не успел дождаться ответа. Адреса, которые нельзя нормализовать, в
+    ответ не попадают.
+    """
+    canonical_addresses = {}
+    address_texts = {}
+    for address in addresses:
+        canonical_address = address and canonicalize_address(address)
+        if canonical_address:
+            canonical_addresses[address] = canonical_address
+            address_texts.setdefault(canonical_address, address.strip())
+    if not canonical_addresses:
+        return {}
+
+    now = timezone.now()
+    coords_by_key = coordinates_cache.get_many(set(address_texts))
+
+    not_cached = address_texts.keys() - coords_by_key.keys()
+    locations = {
+        location.canonical_address: location
+        for location in Location.objects.filter(canonical_address__in=not_cached)
+    }
+    fresh_locations = [
+        location for location in locations.values() if _is_fresh(location, now)
+    ]
+    coordinates_cache.set_many({
+        location.canonical_address: ((location.lon, location.lat), _expires_at(location))
+        for location in fresh_locations
+    })
+    coords_by_key.update({
+        location.canonical_address: (location.lon, location.lat)
+        for location in fresh_locations
+    })
+    failure_reasons = dict.fromkeys(coords_by_key, '')
+    backing_off_locations = [
+        location for location in locations.values()
+        if not _is_fresh(location, now) and _is_backing_off(location, now)
+    ]
+    coords_by_key.update({
+        location.canonical_address: _known_coords(location)
+        for location in backing_off_locations
+    })
+    failure_reasons.update({
+        location.canonical_address: location.failure_reason
+        for location in backing_off_locations
+    })
+
+    misses = sorted(address_texts.keys() - coords_by_key.keys())
+    if misses:
+        results = _geocode_many(
+            _claimable_locations(misses, locations, address_texts),
+            now,
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+        )
+        coords_by_key.update({
+            canonical_address: coords
+            for canonical_address, (coords, _) in results.items()
+        })
+        failure_reasons.update({
+            canonical_address: failure_reason
+            for canonical_address, (_, failure_reason) in results.items()
+        })
+
+    return {
+        address: (coords_by_key.get(canonical_address), failure_reasons.get(canonical_address))
+        for address, canonical_address in canonical_addresses.items()
+    }
+
+
+def _claimable_locations(canonical_addresses, locations, address_texts) -> list:
+    """Строки Location для адресов, с первичными ключами: на них ставится метка."""
+    missing = [
+        Location(address=address_texts[canonical_address], canonical_address=canonical_address)
+        for canonical_address in canonical_addresses
+        if canonical_address not in locations
+    ]
+    if missing:
+        Location.objects.bulk_create(missing, ignore_conflicts=True)
+        locations = {
+            **locations,
+            **{
+                location.canonical_address: location
+                for location in Location.objects.filter(
+                    canonical_address__in=[location.canonical_address for location in missing],
+                )
+            },
+        }
+    return [locations[canonical_address] for canonical_address in canonical_addresses]
+
+
+def _geocode_many(locations, now, max_workers=None, requests_per_second=None) -> dict:
+    """Геокодирует адреса пачкой, возвращает `{адрес: (coords, failure_reason)}`.
+
+    Метки ставятся на все адреса сразу и снимаются общим upsert в конце,
+    так что пакетный прогон, как и обычный поиск, не дублирует запросы
+    других процессов: адреса с чужой меткой не запрашиваются, их результат
+    ждём после своих. Обычный поиск в другом процессе ждёт метку пакета
+    не дольше `GEOCODING_CLAIM_WAIT`, после чего отдаёт то, что есть в базе.
+    """
+    claimed, busy = [], []
+    for location in locations:
+        (claimed if _claim_geocoding(location) else busy).append(location)
+
+    # Пока ставили метки, адрес мог геокодировать другой процесс
+    results = {}
+    to_geocode = {}
+    for location in Location.objects.filter(pk__in=[location.pk for location in claimed]):
+        if _needs_geocoding(location, now):
+            to_geocode[location.canonical_address] = location
+        else:
+            results[location.canonical_address] = _settled_result(location)
+    _release_geocoding_many(
+        location for location in claimed if location.canonical_address not in to_geocode
+    )
+
+    if to_geocode:
+        try:
+            updated_locations = _geocode_claimed(
+                to_geocode, results, now, max_workers, requests_per_second,
+            )
+        except BaseException:
+            _release_geocoding_many(to_geocode.values())
+            raise
+
+        Location.objects.bulk_create(
+            updated_locations,
+            update_conflicts=True,
+            unique_fields=['canonical_address'],
+            update_fields=[
+                'lon',
+                'lat',
+                'updated_at',
+                'failure_reason',
+                'failed_attempts',
+                'next_retry_at',
+                'geocoding_until',
+            ],
+        )
+        expires_at = (now + COORDINATES_TTL).timestamp()
+        coordinates_cache.set_many({
+            location.canonical_address: ((location.lon, location.lat), expires_at)
+            for location in updated_locations
+            if not location.failure_reason
+        })
+        if updated_locations:
+            locations_saved.send(sender=Location, locations=updated_locations)
+
+    # Метку мог поставить поиск из этого же процесса: к нему присоединяемся,
+    # остальных ждём по базе
+    joined = [location for location in busy if location.canonical_address in _lookups.calls]
+    for location in joined:
+        (coords, failure_reason, _), _ = _lookups.do(
+            location.canonical_address, _wait_for_claim, location,
+        )
+        results[location.canonical_address] = coords, failure_reason
+    for location in _wait_for_geocoding_many(
+        location for location in busy if location not in joined
+    ):
+        results[location.canonical_address] = _settled_result(location)
+    return results
+
+
+def _geocode_claimed(locations, results, now, max_workers, requests_per_second) -> list:
+    """Запрашивает геокодер по адресам с нашей меткой, возвращает строки для upsert."""
+    rate_limiter = RateLimiter(requests_per_second or settings.GEOCODE_REQUESTS_PER_SECOND)
+
+    # Результат в том же виде, что у `_lookup_coordinates`: к этому
+    # вызову может присоединиться обычный поиск того же адреса
+    def geocode(canonical_address):
+        location = locations[canonical_address]
+        if circuit_breaker.is_open:
+            return _known_coords(location), None, False
+        rate_limiter.wait()
+        coords, failure_reason = _geocode(location.address)
+        if failure_reason is not None:
+            _apply_geocode_result(location, coords, failure_reason, now)
+            location.geocoding_until = None
+        return _known_coords(location), failure_reason, False
+
+    def fetch(canonical_address):
+        return _lookups.do(canonical_address, geocode, canonical_address)
+
+    workers = min(max_workers or settings.GEOCODE_MAX_WORKERS, len(locations))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        flights = dict(zip(locations, executor.map(fetch, locations)))
+
+    updated_locations, not_geocoded = [], []
+    for canonical_address, ((coords, failure_reason, _), shared) in flights.items():
+        results[canonical_address] = coords, failure_reason
+        # Общий результат уже сохранил тот, кто выполнял запрос
+        if not shared and failure_reason is not None:
+            updated_locations.append(locations[canonical_address])
+        else:
+            not_geocoded.append(locations[canonical_address])
+    _release_geocoding_many(not_geocoded)
+    return updated_locations
+
+
+def _settled_result(location):
+    """Результат адреса, который геокодировал кто-то другой."""
+    if _needs_geocoding(location, timezone.now()):
+        # Метка истекла, а результата нет: адрес никто не геокодировал
+        return _known_coords(location), None
+    return _cached_or_known_coords(location), location.failure_reason
+
+
+def addresses_to_geocode(addresses) -> set:
+    """Нормализованные адреса, которые `fetch_coordinates_many` отправит в геокодер."""
+    canonical_addresses = {
+        canonicalize_address(address) for address in addresses if address
+    } - {''}
+    now = timezone.now()
+    locations = Location.objects.filter(canonical_address__in=canonical_addresses)
+    return canonical_addresses - {
+        location.canonical_address
+        for location in locations
+        if _is_fresh(location, now) or _is_backing_off(location, now)
+    }
+
+
+def invalidate_coordinates(address: str):
+    canonical_address = address and canonicalize_address(address)
+    if canonical_address:
+        coordinates_cache.invalidate(canonical_address)
+
+
+def geocode_cache_stats() -> dict:
+    return coordinates_cache.stats()
+
+
+def geocoder_stats() -> dict:
+    return get_geocoder().stats()
+
+
+def _expires_at(location) -> float:
+    return (location.updated_at + COORDINATES_TTL).timestamp()
+
+
+def _is_backing_off(location, now) -> bool:
+    return location.next_retry_at is not None and location.next_retry_at > now
+
+
+def _is_usable_stale(location, now) -> bool:
+    """Координаты устарели, но их ещё можно отдать, пока идёт обновление."""
+    return (
+        location.lon is not None
+        and location.lat is not None
+        and location.updated_at >= now - COORDINATES_HARD_TTL
+    )
+
+
+def _is_fresh(location, now) -> bool:
+    return (
+        location.lon is not None
+        and location.lat is not None
+        and not location.failure_reason
+        and location.updated_at >= now - COORDINATES_TTL
+    )
 
 
 def distance_km(coords1, coords2) -> float:
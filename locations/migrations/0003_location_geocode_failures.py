@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0002_alter_location_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='failed_attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='неудачных попыток'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='failure_reason',
+            field=models.CharField(blank=True, choices=[('not_found', 'адрес не найден'), ('request_error', 'ошибка запроса'), ('bad_response', 'некорректный ответ')], max_length=20, verbose_name='причина ошибки'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='next_retry_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='повторить не раньше'),
+        ),
+    ]
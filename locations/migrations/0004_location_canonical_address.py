@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_location_geocode_failures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='canonical_address',
+            field=models.CharField(editable=False, max_length=255, null=True, verbose_name='нормализованный адрес'),
+        ),
+    ]
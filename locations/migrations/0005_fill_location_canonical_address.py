@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Копия locations.normalization на момент написания миграции: если
+# нормализацию потом поменяют, миграция должна делать с данными то же, что и
+# раньше
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'пос': 'поселок',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+    'эт': 'этаж',
+    'под': 'подъезд',
+}
+TOKEN_PATTERN = re.compile(r'\w+(?:-\w+)*')
+
+
+def canonicalize_address(address):
+    text = unicodedata.normalize('NFKC', address).casefold().replace('ё', 'е')
+    tokens = [
+        ABBREVIATIONS.get(token, token)
+        for token in TOKEN_PATTERN.findall(text)
+    ]
+    tokens = [
+        token for token, next_token in zip(tokens, tokens[1:] + [''])
+        if not (token == 'дом' and next_token[:1].isdigit())
+    ]
+    return ' '.join(tokens)[:255]
+
+
+def _location_rank(location):
+    has_coords = location.lon is not None and location.lat is not None
+    return (has_coords and not location.failure_reason, has_coords, location.updated_at)
+
+
+def fill_canonical_addresses(apps, schema_editor):
+    Location = apps.get_model('locations', 'Location')
+    locations_by_key = {}
+    for location in Location.objects.all():
+        key = canonicalize_address(location.address)
+        locations_by_key.setdefault(key, []).append(location)
+
+    for key, locations in locations_by_key.items():
+        locations.sort(key=_location_rank, reverse=True)
+        best, duplicates = locations[0], locations[1:]
+        if duplicates:
+            Location.objects.filter(pk__in=[location.pk for location in duplicates]).delete()
+        best.canonical_address = key
+        best.save(update_fields=['canonical_address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_location_canonical_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_canonical_addresses, migrations.RunPython.noop),
+    ]
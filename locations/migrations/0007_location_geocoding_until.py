@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0006_alter_location_canonical_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geocoding_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='геокодируется до'),
+        ),
+    ]
@@ -1,10 +1,52 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.dispatch import Signal
+
+from .normalization import CANONICAL_ADDRESS_MAX_LENGTH, canonicalize_address
+
+# Массовое сохранение адресов в обход `save`, аргумент `locations`
+locations_saved = Signal()
+
 
 class Location(models.Model):
+    FAILURE_NOT_FOUND = 'not_found'
+    FAILURE_REQUEST_ERROR = 'request_error'
+    FAILURE_BAD_RESPONSE = 'bad_response'
+    FAILURE_CHOICES = [
+        (FAILURE_NOT_FOUND, 'адрес не найден'),
+        (FAILURE_REQUEST_ERROR, 'ошибка запроса'),
+        (FAILURE_BAD_RESPONSE, 'некорректный ответ'),
+    ]
+
     address = models.CharField('адрес', max_length=200, unique=True)
+    canonical_address = models.CharField(
+        'нормализованный адрес',
+        max_length=CANONICAL_ADDRESS_MAX_LENGTH,
+        unique=True,
+        editable=False,
+    )
     lon = models.FloatField('долгота', null=True, blank=True)
     lat = models.FloatField('широта', null=True, blank=True)
     updated_at = models.DateTimeField('обновлено', auto_now=True)
+    failure_reason = models.CharField(
+        'причина ошибки',
+        max_length=20,
+        choices=FAILURE_CHOICES,
+        blank=True,
+    )
+    failed_attempts = models.PositiveIntegerField('неудачных попыток', default=0)
+    next_retry_at = models.DateTimeField(
+        'повторить не раньше',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    geocoding_until = models.DateTimeField(
+        'геокодируется до',
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'адрес'
@@ -12,3 +54,25 @@ class Location(models.Model):
 
     def __str__(self):
         return self.address
+
+    def validate_unique(self, exclude=None):
+        super().validate_unique(exclude=exclude)
+        if exclude and 'address' in exclude:
+            return
+        duplicate = (
+            Location.objects
+            .filter(canonical_address=canonicalize_address(self.address))
+            .exclude(pk=self.pk)
+            .first()
+        )
+        if duplicate is not None:
+            raise ValidationError({
+                'address': f'Этот адрес уже сохранён как «{duplicate.address}»',
+            })
+
+    def save(self, *args, **kwargs):
+        self.canonical_address = canonicalize_address(self.address)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'address' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'canonical_address'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,48 @@
+import re
+import unicodedata
+
+CANONICAL_ADDRESS_MAX_LENGTH = 255
+
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'пос': 'поселок',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+    'эт': 'этаж',
+    'под': 'подъезд',
+}
+
+TOKEN_PATTERN = re.compile(r'\w+(?:-\w+)*')
+
+
+def canonicalize_address(address: str) -> str:
+    text = unicodedata.normalize('NFKC', address).casefold().replace('ё', 'е')
+    tokens = [
+        ABBREVIATIONS.get(token, token)
+        for token in TOKEN_PATTERN.findall(text)
+    ]
+    # «д. 1» и просто «1» — один и тот же дом
+    tokens = [
+        token for token, next_token in zip(tokens, tokens[1:] + [''])
+        if not (token == 'дом' and next_token[:1].isdigit())
+    ]
+    return ' '.join(tokens)[:CANONICAL_ADDRESS_MAX_LENGTH]
@@ -0,0 +1,122 @@
+"""k-d дерево по точкам на сфере.
+
+Точки `(lon, lat)` переводятся в трёхмерные векторы на единичной сфере:
+длина хорды монотонна по расстоянию по дуге, поэтому дерево по евклидовой
+метрике отвечает на запросы по сферическому расстоянию. Расстояния в
+ответах — по сфере среднего радиуса, как у метрики `haversine`.
+"""
+import heapq
+import math
+
+import numpy as np
+
+from .distances import EARTH_RADIUS_KM
+
+
+def _to_unit_vector(coords):
+    lon, lat = np.radians(coords)
+    return np.array([
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    ])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def _km_to_chord(km):
+    return 2 * math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+class SpatialIndex:
+    """Поиск ближайших объектов по координатам.
+
+    `items` и `coords` идут парами; объекты без координат в индекс не попадают.
+    `predicate` в запросах отсеивает объекты, не прерывая обход дерева.
+    """
+
+    def __init__(self, items, coords):
+        self.items = []
+        points = []
+        for item, item_coords in zip(items, coords):
+            if item_coords is None:
+                continue
+            self.items.append(item)
+            points.append(_to_unit_vector(item_coords))
+        self.points = np.array(points).reshape(-1, 3)
+        self.root = self._build(list(range(len(self.items))), depth=0)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda index: self.points[index, axis])
+        middle = len(indices) // 2
+        return (
+            indices[middle],
+            axis,
+            self._build(indices[:middle], depth + 1),
+            self._build(indices[middle + 1:], depth + 1),
+        )
+
+    def nearest(self, coords, k, predicate=None) -> list:
+        if coords is None or k <= 0:
+            return []
+        target = _to_unit_vector(coords)
+        best = []
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            item = self.items[index]
+            if predicate is None or predicate(item):
+                chord = float(np.linalg.norm(self.points[index] - target))
+                if len(best) < k:
+                    heapq.heappush(best, (-chord, index))
+                elif chord < -best[0][0]:
+                    heapq.heapreplace(best, (-chord, index))
+
+            offset = target[axis] - self.points[index, axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            visit(near)
+            if len(best) < k or abs(offset) < -best[0][0]:
+                visit(far)
+
+        visit(self.root)
+        return [
+            (self.items[index], _chord_to_km(-negative_chord))
+            for negative_chord, index in sorted(best, reverse=True)
+        ]
+
+    def within(self, coords, radius_km, predicate=None) -> list:
+        if coords is None or radius_km < 0:
+            return []
+        target = _to_unit_vector(coords)
+        max_chord = _km_to_chord(radius_km)
+        found = []
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            chord = float(np.linalg.norm(self.points[index] - target))
+            if chord <= max_chord:
+                item = self.items[index]
+                if predicate is None or predicate(item):
+                    found.append((chord, index))
+
+            offset = target[axis] - self.points[index, axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            visit(near)
+            if abs(offset) <= max_chord:
+                visit(far)
+
+        visit(self.root)
+        found.sort()
+        return [(self.items[index], _chord_to_km(chord)) for chord, index in found]
@@ -1,3 +1,728 @@
-from django.test import TestCase
+import json
+import math
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from geopy.distance import geodesic, great_circle
+
+from foodcartapp.models import Restaurant
+
+from . import geodata
+from .backends import (
+    BaseGeocoder,
+    CircuitBreaker,
+    CircuitOpenError,
+    FileGeocoder,
+    GeocoderError,
+)
+from .cache import CoordinatesCache, LRUCache
+from .distances import EARTH_RADIUS_KM, distance_matrix, paired_distances
+from .models import Location, locations_saved
+from .normalization import CANONICAL_ADDRESS_MAX_LENGTH, canonicalize_address
+from .singleflight import SingleFlight
+from .spatial import SpatialIndex
+
+MOSCOW = (37.6176, 55.7558)
+SAINT_PETERSBURG = (30.3141, 59.9386)
+
+
+class DistancesTest(SimpleTestCase):
+    def test_geodesic_matches_geopy(self):
+        rng = random.Random(1)
+        points = [(rng.uniform(-180, 180), rng.uniform(-89, 89)) for _ in range(30)]
+        origins, destinations = points[:15], points[15:]
+        distances = paired_distances(origins, destinations, metric='geodesic')
+        for (lon1, lat1), (lon2, lat2), dist in zip(origins, destinations, distances):
+            self.assertAlmostEqual(dist, geodesic((lat1, lon1), (lat2, lon2)).km, delta=1e-6)
+
+    def test_nearly_antipodal_points_fall_back_to_geopy(self):
+        origin, destination = (0, 0), (179.7, 0.5)
+        [dist] = paired_distances([origin], [destination], metric='geodesic')
+        self.assertAlmostEqual(dist, geodesic((0, 0), (0.5, 179.7)).km, delta=1e-6)
+
+    def test_haversine_matches_great_circle(self):
+        [dist] = paired_distances([MOSCOW], [SAINT_PETERSBURG], metric='haversine')
+        expected = great_circle(
+            MOSCOW[::-1], SAINT_PETERSBURG[::-1], radius=EARTH_RADIUS_KM,
+        ).km
+        self.assertAlmostEqual(dist, expected, delta=1e-6)
+
+    def test_equirectangular_is_close_on_city_scale(self):
+        origin, destination = (37.60, 55.75), (37.70, 55.80)
+        [approximate] = paired_distances([origin], [destination], metric='equirectangular')
+        [exact] = paired_distances([origin], [destination], metric='haversine')
+        self.assertLess(abs(approximate - exact) / exact, 0.001)
+
+    def test_matrix_shape_and_unknown_coordinates(self):
+        matrix = distance_matrix([MOSCOW, None], [MOSCOW, SAINT_PETERSBURG, None])
+        self.assertEqual(matrix.shape, (2, 3))
+        self.assertAlmostEqual(matrix[0, 0], 0)
+        self.assertTrue(np.isnan(matrix[0, 2]))
+        self.assertTrue(np.isnan(matrix[1]).all())
+        self.assertEqual(distance_matrix([], [MOSCOW]).shape, (0, 1))
+
+    def test_matrix_agrees_with_paired(self):
+        origins = [MOSCOW, SAINT_PETERSBURG]
+        destinations = [SAINT_PETERSBURG, MOSCOW]
+        matrix = distance_matrix(origins, destinations)
+        paired = paired_distances(origins, destinations)
+        self.assertTrue(np.allclose(np.diag(matrix), paired))
+        self.assertTrue(math.isclose(matrix[0, 0], matrix[1, 1]))
+
+    def test_rejects_unknown_metric_and_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            distance_matrix([MOSCOW], [MOSCOW], metric='manhattan')
+        with self.assertRaises(ValueError):
+            paired_distances([MOSCOW], [])
+
+
+class SpatialIndexTest(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.coords = [(rng.uniform(37.3, 37.9), rng.uniform(55.5, 56.0)) for _ in range(200)]
+        self.coords.append(None)
+        self.items = list(range(len(self.coords)))
+        self.index = SpatialIndex(self.items, self.coords)
+        self.target = (37.62, 55.75)
+
+    def brute_force(self, predicate=lambda item: True):
+        known = [item for item in self.items if self.coords[item] is not None and predicate(item)]
+        distances = paired_distances(
+            [self.target] * len(known),
+            [self.coords[item] for item in known],
+            metric='haversine',
+        )
+        return sorted(zip(distances, known))
+
+    def test_skips_items_without_coordinates(self):
+        self.assertEqual(len(self.index), 200)
+
+    def test_nearest_matches_brute_force(self):
+        expected = self.brute_force()[:5]
+        found = self.index.nearest(self.target, k=5)
+        self.assertEqual([item for item, _ in found], [item for _, item in expected])
+        for (_, dist), (expected_dist, _) in zip(found, expected):
+            self.assertAlmostEqual(dist, expected_dist, delta=1e-6)
+
+    def test_nearest_with_predicate(self):
+        def is_even(item):
+            return item % 2 == 0
+
+        expected = [item for _, item in self.brute_force(is_even)[:3]]
+        found = self.index.nearest(self.target, k=3, predicate=is_even)
+        self.assertEqual([item for item, _ in found], expected)
+
+    def test_within_matches_brute_force(self):
+        expected = [item for dist, item in self.brute_force() if dist <= 5]
+        found = self.index.within(self.target, radius_km=5)
+        self.assertEqual([item for item, _ in found], expected)
+
+    def test_empty_queries(self):
+        self.assertEqual(self.index.nearest(None, k=3), [])
+        self.assertEqual(self.index.nearest(self.target, k=0), [])
+        self.assertEqual(self.index.within(self.target, radius_km=-1), [])
+        self.assertEqual(SpatialIndex([], []).nearest(self.target, k=3), [])
+
+
+class CanonicalizeAddressTest(SimpleTestCase):
+    def test_spelling_variants_match(self):
+        variants = [
+            'Москва, ул. Тверская, д. 1',
+            'москва улица тверская 1',
+            'МОСКВА,  УЛ ТВЕРСКАЯ,  Д.1',
+            'г. Москва, ул. Тверская, дом 1',
+        ]
+        canonical = {canonicalize_address(address) for address in variants[:3]}
+        self.assertEqual(canonical, {'москва улица тверская 1'})
+        self.assertEqual(canonicalize_address(variants[3]), 'город москва улица тверская 1')
+
+    def test_yo_and_unicode_forms(self):
+        self.assertEqual(canonicalize_address('Ёлочная ул'), canonicalize_address('елочная улица'))
+        self.assertEqual(canonicalize_address('ｕｌ 5'), 'ul 5')
+
+    def test_keeps_house_word_before_non_numbers(self):
+        self.assertEqual(canonicalize_address('д. Горки'), 'дом горки')
+
+    def test_hyphenated_abbreviations(self):
+        self.assertEqual(canonicalize_address('пр-т Мира, 10 к 2'), 'проспект мира 10 корпус 2')
+
+    def test_is_truncated(self):
+        self.assertEqual(len(canonicalize_address('а ' * 500)), CANONICAL_ADDRESS_MAX_LENGTH)
+
+
+class LocationCanonicalAddressTest(TestCase):
+    def test_save_sets_canonical_address(self):
+        location = Location.objects.create(address='Москва, ул. Тверская, д. 1')
+        self.assertEqual(location.canonical_address, 'москва улица тверская 1')
+
+        location.address = 'Москва, ул. Арбат, 2'
+        location.save(update_fields=['address'])
+        location.refresh_from_db()
+        self.assertEqual(location.canonical_address, 'москва улица арбат 2')
+
+    def test_validate_unique_rejects_canonical_duplicates(self):
+        Location.objects.create(address='Москва, ул. Тверская, д. 1')
+        duplicate = Location(address='москва улица тверская 1')
+        with self.assertRaises(ValidationError) as context:
+            duplicate.full_clean()
+        self.assertIn('address', context.exception.message_dict)
+
+    def test_validate_unique_allows_editing_itself(self):
+        location = Location.objects.create(address='Москва, ул. Тверская, д. 1')
+        location.address = 'москва улица тверская 1'
+        location.full_clean()
+
+    def test_location_save_updates_matching_restaurants(self):
+        restaurant = Restaurant.objects.create(name='Ресторан', address='Москва, ул. Тверская, д. 1')
+        other = Restaurant.objects.create(name='Другой', address='Москва, ул. Арбат, 2')
+        Location.objects.create(address='москва улица тверская 1', lon=37.6, lat=55.7)
+
+        restaurant.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(restaurant.coords, (37.6, 55.7))
+        self.assertIsNone(other.coords)
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('locations.backends.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            failure_threshold=2,
+            recovery_timeout=30,
+            ignored_reasons=[Location.FAILURE_NOT_FOUND],
+        )
+
+    def fail(self, reason='http_error'):
+        def geocode():
+            raise GeocoderError(reason)
+        with self.assertRaises(GeocoderError):
+            self.breaker.call(geocode)
+
+    def test_opens_after_threshold(self):
+        self.fail()
+        self.assertFalse(self.breaker.is_open)
+        self.fail()
+        self.assertTrue(self.breaker.is_open)
+
+        geocode = mock.Mock()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(geocode)
+        geocode.assert_not_called()
+
+    def test_success_resets_failures(self):
+        self.fail()
+        self.breaker.call(lambda: None)
+        self.fail()
+        self.assertFalse(self.breaker.is_open)
+
+    def test_ignored_reasons_do_not_count(self):
+        for _ in range(5):
+            self.fail(Location.FAILURE_NOT_FOUND)
+        self.assertFalse(self.breaker.is_open)
+
+    def test_half_open_probe(self):
+        self.fail()
+        self.fail()
+        self.now += 30
+        self.assertFalse(self.breaker.is_open)
+
+        self.fail()
+        self.assertTrue(self.breaker.is_open)
+
+        self.now += 30
+        self.assertEqual(self.breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+class FileGeocoderTest(SimpleTestCase):
+    def make_file(self, coordinates):
+        file = tempfile.NamedTemporaryFile('w', suffix='.json', encoding='utf-8')
+        self.addCleanup(file.close)
+        json.dump(coordinates, file, ensure_ascii=False)
+        file.flush()
+        return file.name
+
+    def test_base_geocoder_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BaseGeocoder()
+
+    def test_reads_coordinates_from_file(self):
+        path = self.make_file({
+            'Москва, ул. Тверская, д. 1': [37.61, 55.76],
+            'Нигде': None,
+            'Тоже нигде': [],
+        })
+        geocoder = FileGeocoder(path=path, generate_missing=False)
+
+        self.assertEqual(geocoder.geocode('москва улица тверская 1'), (37.61, 55.76))
+        for address in ['Нигде', 'Тоже нигде', 'Неизвестный адрес']:
+            with self.assertRaises(GeocoderError) as context:
+                geocoder.geocode(address)
+            self.assertEqual(context.exception.reason, Location.FAILURE_NOT_FOUND)
+
+    def test_generated_coordinates_are_stable_and_inside_bbox(self):
+        geocoder = FileGeocoder(bbox=(37.0, 55.0, 38.0, 56.0))
+        lon, lat = geocoder.geocode('Москва, ул. Арбат, 2')
+
+        self.assertTrue(37.0 <= lon <= 38.0)
+        self.assertTrue(55.0 <= lat <= 56.0)
+        self.assertEqual(geocoder.geocode('москва улица арбат 2'), (lon, lat))
+        self.assertNotEqual(geocoder.geocode('Москва, ул. Арбат, 3'), (lon, lat))
+
+
+def count_followers(flight, key):
+    """Семафор, который отпускается каждым, кто присоединился к вызову `key`."""
+    call = flight.calls[key]
+    joined = threading.Semaphore(0)
+    wait = call.done.wait
+
+    def counting_wait(*args):
+        joined.release()
+        return wait(*args)
+
+    call.done.wait = counting_wait
+    return joined
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(flight.do, 'key', work)
+            started.wait(5)
+            joined = count_followers(flight, 'key')
+            followers = [executor.submit(flight.do, 'key', work) for _ in range(3)]
+            for _ in followers:
+                joined.acquire(timeout=5)
+            release.set()
+            results = [leader.result()] + [future.result() for future in followers]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results[0], ('result', False))
+        self.assertEqual(results[1:], [('result', True)] * 3)
+        self.assertEqual(flight.calls, {})
+
+    def test_error_is_raised_and_key_released(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 1), (1, False))
+
+
+class GeocoderMockMixin:
+    def setUp(self):
+        geodata.coordinates_cache.local.clear()
+        cache.clear()
+        geodata.circuit_breaker._on_success()
+        patcher = mock.patch('locations.geodata._fetch_coordinates_from_api')
+        self.geocode = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.geocode.return_value = (37.6, 55.7)
+
+
+class GeocodingTestCase(GeocoderMockMixin, TestCase):
+    pass
+
+
+class GeocodingClaimTest(GeocodingTestCase):
+    address = 'Москва, ул. Тверская, д. 1'
+
+    def test_lookup_leaves_no_claim(self):
+        self.assertEqual(geodata.fetch_coordinates(self.address), (37.6, 55.7))
+        self.assertEqual(self.geocode.call_count, 1)
+        self.assertIsNone(Location.objects.get().geocoding_until)
+
+    def test_error_releases_claim(self):
+        self.geocode.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            geodata.fetch_coordinates(self.address)
+        self.assertIsNone(Location.objects.get().geocoding_until)
+
+    def test_waits_for_claim_held_elsewhere(self):
+        location = Location.objects.create(
+            address=self.address,
+            geocoding_until=timezone.now() + geodata.GEOCODING_CLAIM_TIMEOUT,
+        )
+
+        def other_process_finishes(seconds):
+            Location.objects.filter(pk=location.pk).update(
+                lon=30.3, lat=59.9, geocoding_until=None,
+            )
+
+        with mock.patch('locations.geodata.time.sleep', other_process_finishes):
+            coords = geodata.fetch_coordinates(self.address)
+
+        self.assertEqual(coords, (30.3, 59.9))
+        self.geocode.assert_not_called()
+
+    def test_bulk_lookup_leaves_no_claims(self):
+        addresses = [self.address, 'Москва, ул. Арбат, 2']
+        self.assertEqual(
+            geodata.fetch_coordinates_many(addresses),
+            dict.fromkeys(addresses, (37.6, 55.7)),
+        )
+        self.assertEqual(self.geocode.call_count, 2)
+        self.assertFalse(Location.objects.filter(geocoding_until__isnull=False).exists())
+
+    def test_bulk_lookup_waits_for_claim_held_elsewhere(self):
+        location = Location.objects.create(
+            address=self.address,
+            geocoding_until=timezone.now() + geodata.GEOCODING_CLAIM_TIMEOUT,
+        )
+
+        def other_process_finishes(seconds):
+            Location.objects.filter(pk=location.pk).update(
+                lon=30.3, lat=59.9, geocoding_until=None,
+            )
+
+        with mock.patch('locations.geodata.time.sleep', other_process_finishes):
+            coords = geodata.fetch_coordinates_many([self.address, 'Москва, ул. Арбат, 2'])
+
+        self.assertEqual(coords[self.address], (30.3, 59.9))
+        self.geocode.assert_called_once_with('Москва, ул. Арбат, 2')
+
+    def test_bulk_lookup_releases_claims_on_error(self):
+        self.geocode.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            geodata.fetch_coordinates_many([self.address])
+        self.assertIsNone(Location.objects.get().geocoding_until)
+
+    def test_expired_claim_is_taken_over(self):
+        Location.objects.create(
+            address=self.address,
+            geocoding_until=timezone.now() - geodata.GEOCODING_CLAIM_TIMEOUT,
+        )
+        self.assertEqual(geodata.fetch_coordinates(self.address), (37.6, 55.7))
+        self.assertEqual(self.geocode.call_count, 1)
+
+
+class GeocodingBackoffTest(GeocodingTestCase):
+    address = 'Нигде, ул. Несуществующая, 0'
+
+    def setUp(self):
+        super().setUp()
+        self.geocode.side_effect = GeocoderError(Location.FAILURE_NOT_FOUND)
+
+    def test_not_found_is_not_retried_while_backing_off(self):
+        self.assertIsNone(geodata.fetch_coordinates(self.address))
+        self.assertIsNone(geodata.fetch_coordinates(self.address))
+        self.assertEqual(self.geocode.call_count, 1)
+
+        location = Location.objects.get()
+        self.assertEqual(location.failure_reason, Location.FAILURE_NOT_FOUND)
+        self.assertEqual(location.failed_attempts, 1)
+
+    def test_backoff_grows_exponentially_up_to_limit(self):
+        delays = []
+        for _ in range(12):
+            Location.objects.update(next_retry_at=None)
+            before = timezone.now()
+            geodata.fetch_coordinates(self.address)
+            location = Location.objects.get()
+            delays.append((location.next_retry_at - before).total_seconds())
+
+        base = settings.GEOCODE_RETRY_BASE_DELAY
+        self.assertAlmostEqual(delays[0], base, delta=5)
+        self.assertAlmostEqual(delays[1], base * 2, delta=5)
+        self.assertAlmostEqual(delays[2], base * 4, delta=5)
+        self.assertAlmostEqual(delays[-1], settings.GEOCODE_RETRY_MAX_DELAY, delta=5)
+        self.assertEqual(self.geocode.call_count, 12)
+
+
+class StaleCoordinatesTest(GeocodingTestCase):
+    address = 'Москва, ул. Тверская, д. 1'
+
+    def setUp(self):
+        super().setUp()
+        Location.objects.create(address=self.address, lon=30.3, lat=59.9)
+        Location.objects.update(
+            updated_at=timezone.now() - geodata.COORDINATES_TTL - timedelta(seconds=1),
+        )
+
+    def test_stale_coordinates_are_served_and_refreshed_once(self):
+        with mock.patch('locations.geodata.schedule_coordinates_refresh') as schedule:
+            coords = geodata.fetch_coordinates(self.address)
+
+        self.assertEqual(coords, (30.3, 59.9))
+        self.geocode.assert_not_called()
+        schedule.assert_called_once_with(canonicalize_address(self.address), self.address)
+
+    def test_refresh_updates_coordinates(self):
+        with mock.patch('locations.geodata.connections.close_all'):
+            geodata._refresh_coordinates(canonicalize_address(self.address), self.address)
+
+        self.assertEqual(self.geocode.call_count, 1)
+        self.assertEqual(geodata.fetch_coordinates(self.address), (37.6, 55.7))
+
+    def test_expired_coordinates_are_geocoded_at_once(self):
+        Location.objects.update(
+            updated_at=timezone.now() - geodata.COORDINATES_HARD_TTL - timedelta(seconds=1),
+        )
+        self.assertEqual(geodata.fetch_coordinates(self.address), (37.6, 55.7))
+        self.assertEqual(self.geocode.call_count, 1)
+
+
+class OverlappingLookupsTest(GeocoderMockMixin, TransactionTestCase):
+    """Обычный и пакетный поиск одного адреса делят один запрос к геокодеру."""
+
+    def run_overlapping(self, leader, follower, canonical_address):
+        started = threading.Event()
+        release = threading.Event()
+
+        def geocode(address):
+            started.set()
+            release.wait(5)
+            return 37.6, 55.7
+
+        self.geocode.side_effect = geocode
+
+        def run(function):
+            try:
+                return function()
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(run, leader)
+            started.wait(5)
+            joined = count_followers(geodata._lookups, canonical_address)
+            second = executor.submit(run, follower)
+            joined.acquire(timeout=5)
+            release.set()
+            return first.result(), second.result()
+
+    def test_single_lookup_joins_bulk_lookup(self):
+        bulk_result, coords = self.run_overlapping(
+            lambda: geodata.fetch_coordinates_many(['Москва, ул. Тверская 1']),
+            lambda: geodata.fetch_coordinates('москва улица тверская 1'),
+            'москва улица тверская 1',
+        )
+        self.assertEqual(bulk_result, {'Москва, ул. Тверская 1': (37.6, 55.7)})
+        self.assertEqual(coords, (37.6, 55.7))
+        self.assertEqual(self.geocode.call_count, 1)
+
+    def test_bulk_lookup_joins_single_lookup(self):
+        coords, bulk_result = self.run_overlapping(
+            lambda: geodata.fetch_coordinates('москва улица тверская 1'),
+            lambda: geodata.fetch_coordinates_many(['Москва, ул. Тверская 1']),
+            'москва улица тверская 1',
+        )
+        self.assertEqual(coords, (37.6, 55.7))
+        self.assertEqual(bulk_result, {'Москва, ул. Тверская 1': (37.6, 55.7)})
+        self.assertEqual(self.geocode.call_count, 1)
+        location = Location.objects.get()
+        self.assertEqual((location.lon, location.lat), (37.6, 55.7))
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_spaces_out_requests(self):
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        with mock.patch('locations.geodata.time.monotonic', lambda: now[0]), \
+                mock.patch('locations.geodata.time.sleep', sleep):
+            rate_limiter = geodata.RateLimiter(requests_per_second=4)
+            for _ in range(3):
+                rate_limiter.wait()
+            self.assertEqual(sleeps, [0.25, 0.25])
+
+            sleeps.clear()
+            now[0] += 10
+            rate_limiter.wait()
+            self.assertEqual(sleeps, [])
+
+    def test_no_limit(self):
+        with mock.patch('locations.geodata.time.sleep') as sleep:
+            rate_limiter = geodata.RateLimiter(requests_per_second=None)
+            for _ in range(3):
+                rate_limiter.wait()
+        sleep.assert_not_called()
+
+
+class BulkGeocodingTest(GeocodingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved = mock.Mock()
+        locations_saved.connect(self.saved, sender=Location)
+        self.addCleanup(locations_saved.disconnect, self.saved, sender=Location)
+
+    def test_geocodes_each_canonical_address_once(self):
+        addresses = ['Москва, ул. Тверская, д. 1', 'москва улица тверская 1', 'Москва, ул. Арбат, 2', '', None]
+        coords = geodata.fetch_coordinates_many(addresses)
+
+        self.assertEqual(coords, dict.fromkeys(addresses[:3], (37.6, 55.7)))
+        self.assertEqual(self.geocode.call_count, 2)
+        self.assertEqual(Location.objects.count(), 2)
+
+    def test_upserts_stale_rows_and_reads_fresh_ones(self):
+        Location.objects.create(address='Москва, ул. Тверская, д. 1', lon=30.3, lat=59.9)
+        Location.objects.create(address='Москва, ул. Арбат, 2', lon=30.3, lat=59.9)
+        Location.objects.filter(address='Москва, ул. Тверская, д. 1').update(
+            updated_at=timezone.now() - geodata.COORDINATES_HARD_TTL - timedelta(seconds=1),
+        )
+        geodata.coordinates_cache.local.clear()
+        cache.clear()
+
+        coords = geodata.fetch_coordinates_many(['Москва, ул. Тверская, д. 1', 'Москва, ул. Арбат, 2'])
+
+        self.assertEqual(coords, {
+            'Москва, ул. Тверская, д. 1': (37.6, 55.7),
+            'Москва, ул. Арбат, 2': (30.3, 59.9),
+        })
+        self.geocode.assert_called_once_with('Москва, ул. Тверская, д. 1')
+        self.assertEqual(Location.objects.count(), 2)
+        location = Location.objects.get(address='Москва, ул. Тверская, д. 1')
+        self.assertEqual((location.lon, location.lat), (37.6, 55.7))
+        self.assertGreater(location.updated_at, timezone.now() - timedelta(minutes=1))
+
+    def test_sends_locations_saved(self):
+        geodata.fetch_coordinates_many(['Москва, ул. Тверская, д. 1'])
+        self.saved.assert_called_once()
+        [location] = self.saved.call_args.kwargs['locations']
+        self.assertEqual(location.canonical_address, 'москва улица тверская 1')
+
+        self.saved.reset_mock()
+        geodata.fetch_coordinates_many(['Москва, ул. Тверская, д. 1'])
+        self.saved.assert_not_called()
+
+    def test_repeated_lookup_uses_cache(self):
+        geodata.fetch_coordinates_many(['Москва, ул. Тверская, д. 1'])
+        with self.assertNumQueries(0):
+            coords = geodata.fetch_coordinates_many(['Москва, ул. Тверская, д. 1'])
+        self.assertEqual(coords, {'Москва, ул. Тверская, д. 1': (37.6, 55.7)})
+
+    def test_failure_reasons(self):
+        self.geocode.side_effect = GeocoderError(Location.FAILURE_NOT_FOUND)
+        address = 'Нигде, 0'
+        self.assertEqual(
+            geodata.fetch_geocode_results_many([address]),
+            {address: (None, Location.FAILURE_NOT_FOUND)},
+        )
+        # Пока адрес ждёт повтора, геокодер не спрашивают, а причина та же
+        self.assertEqual(
+            geodata.fetch_geocode_results_many([address]),
+            {address: (None, Location.FAILURE_NOT_FOUND)},
+        )
+        self.assertEqual(self.geocode.call_count, 1)
+
+    def test_open_circuit_skips_geocoder(self):
+        with mock.patch.object(
+            type(geodata.circuit_breaker), 'is_open', new_callable=mock.PropertyMock,
+        ) as is_open:
+            is_open.return_value = True
+            results = geodata.fetch_geocode_results_many(['Москва, ул. Тверская, д. 1'])
+
+        self.assertEqual(results, {'Москва, ул. Тверская, д. 1': (None, None)})
+        self.geocode.assert_not_called()
+        self.saved.assert_not_called()
+        location = Location.objects.get()
+        self.assertEqual(location.failed_attempts, 0)
+        self.assertIsNone(location.geocoding_until)
+
+
+class LRUCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch('locations.cache.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+    def test_entries_expire(self):
+        lru = LRUCache(maxsize=10, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2, ttl=10)
+        lru.set('c', 3, ttl=600)
+
+        self.now += 30
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        # Свой TTL записи не может быть дольше общего
+        self.now += 31
+        self.assertEqual((lru.get('a'), lru.get('c')), (None, None))
+        self.assertEqual(lru.entries, {})
+
+
+class CoordinatesCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = CoordinatesCache()
+        self.expires_at = time.time() + 60
+
+    def test_local_then_shared_then_miss(self):
+        self.cache.set('адрес', (37.6, 55.7), self.expires_at)
+        self.assertEqual(self.cache.get('адрес'), (37.6, 55.7))
+
+        self.cache.clear_local()
+        self.assertEqual(self.cache.get('адрес'), (37.6, 55.7))
+        # Запись из общего кэша поднимается в память процесса
+        self.assertEqual(self.cache.local.get('адрес'), (37.6, 55.7))
+
+        self.assertIsNone(self.cache.get('другой адрес'))
+        self.assertEqual(self.cache.stats(), {'local_hits': 1, 'shared_hits': 1, 'misses': 1})
+
+    def test_invalidate_clears_both_levels(self):
+        self.cache.set('адрес', (37.6, 55.7), self.expires_at)
+        self.cache.invalidate('адрес')
+        self.assertIsNone(self.cache.local.get('адрес'))
+        self.assertIsNone(self.cache.get('адрес'))
+
+    def test_expired_entries_are_not_served(self):
+        self.cache.set('устаревший', (37.6, 55.7), time.time() - 1)
+        self.assertIsNone(self.cache.get('устаревший'))
+
+        self.cache.set('адрес', (37.6, 55.7), self.expires_at)
+        self.cache.clear_local()
+        with mock.patch('locations.cache.time.time', return_value=self.expires_at + 1):
+            self.assertIsNone(self.cache.get('адрес'))
+
+    def test_get_many(self):
+        self.cache.set_many({
+            'первый': ((37.6, 55.7), self.expires_at),
+            'второй': ((30.3, 59.9), self.expires_at),
+        })
+        self.cache.local.delete('второй')
+        self.assertEqual(
+            self.cache.get_many(['первый', 'второй', 'третий']),
+            {'первый': (37.6, 55.7), 'второй': (30.3, 59.9)},
+        )
+        self.assertEqual(self.cache.stats(), {'local_hits': 1, 'shared_hits': 1, 'misses': 1})
@@ -0,0 +1,60 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.utils import timezone
+
+from foodcartapp.models import Order, Restaurant
+
+
+ROWS_TEMPLATE = '{% for order in orders %}{% include "order_row.html" %}{% endfor %}'
+
+
+class Command(BaseCommand):
+    help = 'Замеряет рендер строк страницы заказов с кэшем фрагментов и без него'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        restaurants = [Restaurant(id=index, name=f'Ресторан {index}') for index in range(1, 6)]
+        now = timezone.now()
+        orders = []
+        for order_id in range(1, options['orders'] + 1):
+            order = Order(
+                id=order_id,
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79991234567',
+                address=f'Москва, ул. Тверская, {order_id}',
+                total_cost=Decimal('1234.00'),
+                payment_method=Order.PAYMENT_METHOD_CASH,
+                geocode_status=Order.GEOCODE_OK,
+                updated_at=now,
+            )
+            order.available_restaurants = [
+                (restaurant, index * 1.5) for index, restaurant in enumerate(restaurants, start=1)
+            ]
+            order.geocoder_error = False
+            orders.append(order)
+
+        template = engines['django'].from_string(ROWS_TEMPLATE)
+        # Отдельное поколение, чтобы не пересекаться с реальными фрагментами
+        context = {'orders': orders, 'dashboard_generation': f'bench-{time.time_ns()}'}
+
+        started_at = time.perf_counter()
+        template.render(context)
+        cold = time.perf_counter() - started_at
+
+        warm = []
+        for _ in range(options['repeat']):
+            started_at = time.perf_counter()
+            template.render(context)
+            warm.append(time.perf_counter() - started_at)
+
+        self.stdout.write(f'Заказов: {len(orders)}')
+        self.stdout.write(f'Без кэша (первый рендер): {cold * 1000:.1f} мс')
+        self.stdout.write(f'Из кэша, лучший из {len(warm)}: {min(warm) * 1000:.1f} мс')
+        self.stdout.write(f'Ускорение: {cold / min(warm):.1f}x')
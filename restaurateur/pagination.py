@@ -0,0 +1,73 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from star_burger.cursors import InvalidCursor, decode_cursor, encode_cursor
+
+
+def _parse_timestamp(value, cursor):
+    timestamp = parse_datetime(value) if isinstance(value, str) else None
+    if timestamp is None:
+        raise InvalidCursor(cursor)
+    return timestamp
+
+
+def _parse_id(value, cursor):
+    if not isinstance(value, int):
+        raise InvalidCursor(cursor)
+    return value
+
+
+def encode_order_cursor(order) -> str:
+    return encode_cursor([order.status_priority, order.registered_at.isoformat(), order.id])
+
+
+def decode_order_cursor(cursor: str):
+    status_priority, registered_at, order_id = decode_cursor(cursor, size=3)
+    return (
+        _parse_id(status_priority, cursor),
+        _parse_timestamp(registered_at, cursor),
+        _parse_id(order_id, cursor),
+    )
+
+
+def encode_changes_cursor(updated_at, order_id) -> str:
+    return encode_cursor([updated_at.isoformat(), order_id])
+
+
+def decode_changes_cursor(cursor: str):
+    updated_at, order_id = decode_cursor(cursor, size=2)
+    return _parse_timestamp(updated_at, cursor), _parse_id(order_id, cursor)
+
+
+def paginate_orders(orders, cursor=None, page_size=50):
+    orders = orders.order_by('status_priority', 'registered_at', 'id')
+    if cursor:
+        status_priority, registered_at, order_id = decode_order_cursor(cursor)
+        orders = orders.filter(
+            Q(status_priority__gt=status_priority)
+            | Q(status_priority=status_priority, registered_at__gt=registered_at)
+            | Q(status_priority=status_priority, registered_at=registered_at, id__gt=order_id)
+        )
+
+    page = list(orders[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_order_cursor(page[-1])
+
+
+def changed_orders(orders, cursor, until, limit):
+    updated_at, order_id = decode_changes_cursor(cursor)
+    orders = (
+        orders
+        .filter(
+            Q(updated_at__gt=updated_at)
+            | Q(updated_at=updated_at, id__gt=order_id)
+        )
+        .filter(updated_at__lte=until)
+        .order_by('updated_at', 'id')
+    )
+    changes = list(orders[:limit])
+    if not changes:
+        return changes, cursor
+    return changes, encode_changes_cursor(changes[-1].updated_at, changes[-1].id)
@@ -1,3 +1,173 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from foodcartapp.models import Order
+from star_burger.cursors import InvalidCursor, encode_cursor
+
+from .pagination import (
+    decode_changes_cursor,
+    decode_order_cursor,
+    encode_changes_cursor,
+    paginate_orders,
+)
+
+
+def create_order(**kwargs):
+    return Order.objects.create(**{
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79001234567',
+        'address': 'Москва, Тверская 1',
+        **kwargs,
+    })
+
+
+class CursorTest(SimpleTestCase):
+    def test_changes_cursor_round_trip(self):
+        updated_at = timezone.now()
+        self.assertEqual(
+            decode_changes_cursor(encode_changes_cursor(updated_at, 42)),
+            (updated_at, 42),
+        )
+
+    def test_rejects_malformed_cursors(self):
+        for cursor in [
+            'not base64!',
+            encode_cursor({'a': 1}),
+            encode_cursor([1, 2]),
+            encode_cursor([1, 'not a date', 3]),
+            encode_cursor(['1', timezone.now().isoformat(), 3]),
+        ]:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_order_cursor(cursor)
+
+
+class PaginateOrdersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        registered_at = timezone.now()
+        statuses = [Order.STATUS_NEW, Order.STATUS_ASSEMBLING, Order.STATUS_NEW]
+        for number in range(7):
+            order = create_order(status=statuses[number % 3])
+            # Одинаковое время у части заказов: порядок держится на id
+            Order.objects.filter(pk=order.pk).update(
+                registered_at=registered_at + timedelta(minutes=number // 2),
+            )
+
+    def test_pages_cover_all_orders_in_order(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = paginate_orders(Order.objects.all(), cursor=cursor, page_size=3)
+            seen += page
+            if cursor is None:
+                break
+        expected = list(Order.objects.order_by('status_priority', 'registered_at', 'id'))
+        self.assertEqual(seen, expected)
+
+    def test_last_page_has_no_cursor(self):
+        page, cursor = paginate_orders(Order.objects.all(), page_size=7)
+        self.assertEqual(len(page), 7)
+        self.assertIsNone(cursor)
+
+
+class ManagerTestCase(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(manager)
+
+
+class OrdersDashboardTest(ManagerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.new_order = create_order(status=Order.STATUS_NEW)
+        self.assembling_order = create_order(status=Order.STATUS_ASSEMBLING)
+
+    def test_filters_orders(self):
+        response = self.client.get(reverse('restaurateur:view_orders'), {'status': Order.STATUS_NEW})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['orders']), [self.new_order])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(reverse('restaurateur:view_orders'), {'status': 'BOGUS'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.context['orders'], [])
+        self.assertTrue(response.context['filter_form'].errors)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('restaurateur:view_orders'), {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrdersChangesTest(ManagerTestCase):
+    def get_changes(self, **params):
+        return self.client.get(reverse('restaurateur:view_orders_changes'), params)
+
+    def test_returns_changed_orders(self):
+        order = create_order()
+        Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+        cursor = encode_changes_cursor(timezone.now() - timedelta(hours=1), 0)
+        response = self.get_changes(cursor=cursor, timeout=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['orders']], [order.pk])
+
+    def test_orders_outside_filters_are_removed(self):
+        assembling = create_order(status=Order.STATUS_ASSEMBLING)
+        new = create_order()
+        finished = create_order(status=Order.STATUS_FINISHED)
+        Order.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        cursor = encode_changes_cursor(timezone.now() - timedelta(hours=1), 0)
+
+        response = self.get_changes(cursor=cursor, timeout=0, status=Order.STATUS_NEW)
+
+        orders = {row['id']: row for row in response.json()['orders']}
+        self.assertEqual(set(orders), {assembling.pk, new.pk, finished.pk})
+        self.assertFalse(orders[new.pk]['removed'])
+        self.assertIn(f'order-{new.pk}', orders[new.pk]['html'])
+        self.assertTrue(orders[assembling.pk]['removed'])
+        self.assertTrue(orders[finished.pk]['removed'])
+        self.assertIsNone(orders[finished.pk]['html'])
+
+    def test_rejects_invalid_filters(self):
+        cursor = encode_changes_cursor(timezone.now(), 0)
+        self.assertEqual(self.get_changes(cursor=cursor, timeout=0, status='UNKNOWN').status_code, 400)
+
+    def test_dashboard_passes_filters_to_feed(self):
+        response = self.client.get(reverse('restaurateur:view_orders'), {'status': Order.STATUS_NEW})
+        self.assertEqual(response.context['feed_query'], f'status={Order.STATUS_NEW}')
+
+    def test_rejects_non_finite_and_malformed_timeouts(self):
+        cursor = encode_changes_cursor(timezone.now(), 0)
+        for timeout in ['nan', 'NaN', 'inf', '-inf', 'soon']:
+            with self.subTest(timeout=timeout):
+                self.assertEqual(self.get_changes(cursor=cursor, timeout=timeout).status_code, 400)
+
+    def test_negative_timeout_returns_immediately(self):
+        cursor = encode_changes_cursor(timezone.now(), 0)
+        response = self.get_changes(cursor=cursor, timeout=-5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['orders'], [])
+
+
+class OrdersApiTest(ManagerTestCase):
+    def setUp(self):
+        super().setUp()
+        create_order()
+
+    def test_conditional_get(self):
+        url = reverse('restaurateur:orders_api')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        create_order()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['orders']), 2)
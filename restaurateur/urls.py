@@ -13,6 +13,8 @@ urlpatterns = [
     path('restaurants/', views.view_restaurants, name='RestaurantView'),
 
     path('orders/', views.view_orders, name='view_orders'),
+    path('orders/changes/', views.view_orders_changes, name='view_orders_changes'),
+    path('api/orders/', views.orders_api, name='orders_api'),
 
     path('login/', views.LoginView.as_view(), name='login'),
     path('logout/', views.LogoutView.as_view(), name='logout'),
@@ -1,17 +1,38 @@
+import hashlib
+import math
+import time
+from datetime import timedelta
+
 from django import forms
-from django.db.models import Prefetch, Case, When, Value, IntegerField
+from django.conf import settings
+from django.db.models import Count, Max, Prefetch
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.http import parse_etags
 from django.views import View
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+
+from foodcartapp.generations import get_generation
+from foodcartapp.models import Product, Restaurant, Order, OrderCandidate
 
+from .pagination import InvalidCursor, changed_orders, encode_changes_cursor, paginate_orders
 
-from foodcartapp.models import Product, Restaurant, Order, RestaurantMenuItem, OrderItems
-from locations.geodata import fetch_coordinates, distance_km
-from locations.models import Location
+# Изменения последних секунд отдаём с задержкой: транзакция с более ранним
+# updated_at может закоммититься позже, и курсор не должен её перескочить.
+ORDERS_FEED_SETTLE_DELAY = timedelta(seconds=2)
+ORDERS_FEED_POLL_INTERVAL = 1
+ORDERS_FEED_BATCH_SIZE = 100
 
 
 class Login(forms.Form):
@@ -31,6 +52,53 @@ class Login(forms.Form):
     )
 
 
+class OrderFilterForm(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус',
+        required=False,
+        choices=[('', 'Все')] + [
+            choice for choice in Order.STATUS_CHOICES
+            if choice[0] != Order.STATUS_FINISHED
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    payment_method = forms.ChoiceField(
+        label='Способ оплаты',
+        required=False,
+        choices=[('', 'Все')] + Order.PAYMENT_METHOD_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    cooking_restaurant = forms.ModelChoiceField(
+        label='Ресторан',
+        required=False,
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Все',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    registered_from = forms.DateTimeField(
+        label='Создан с',
+        required=False,
+        widget=forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
+    )
+    registered_to = forms.DateTimeField(
+        label='по',
+        required=False,
+        widget=forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
+    )
+
+    def filter_orders(self, orders):
+        filters = {
+            'status': self.cleaned_data['status'],
+            'payment_method': self.cleaned_data['payment_method'],
+            'cooking_restaurant': self.cleaned_data['cooking_restaurant'],
+            'registered_at__gte': self.cleaned_data['registered_from'],
+            'registered_at__lt': self.cleaned_data['registered_to'],
+        }
+        return orders.filter(**{
+            lookup: value for lookup, value in filters.items() if value
+        })
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -93,103 +161,192 @@ def view_restaurants(request):
     })
 
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-    orders = (
-        Order.objects
-        .not_finished()
-        .with_total_cost()
+def with_ranked_candidates(orders):
+    return (
+        orders
         .select_related('cooking_restaurant')
-        .annotate(
-            status_priority=Case(
-                When(status=Order.STATUS_NEW, then=1),
-                When(status=Order.STATUS_ASSEMBLING, then=2),
-                When(status=Order.STATUS_DELIVERING, then=3),
-                default=4,
-                output_field=IntegerField(),
-            )
-        )
-        .order_by('status_priority', 'registered_at')
         .prefetch_related(
             Prefetch(
-                'items',
-                queryset=OrderItems.objects.select_related('product'),
+                'candidates',
+                queryset=OrderCandidate.objects
+                .select_related('restaurant')
+                .order_by('distance'),
+                to_attr='ranked_candidates',
             )
         )
     )
 
-    restaurants = list(
-        Restaurant.objects.prefetch_related(
-            Prefetch(
-                'menu_items',
-                queryset=RestaurantMenuItem.objects
-                .filter(availability=True)
-                .select_related('product'),
-                to_attr='available_menu_items',
-            )
-        )
-    )
-
-    order_addresses = {order.address for order in orders if order.address}
-    restaurant_addresses = {restaurant.address for restaurant in restaurants if restaurant.address}
-    all_addresses = order_addresses | restaurant_addresses
-
-    locations = Location.objects.filter(address__in=all_addresses)
-    coords_by_address = {}
-    for location in locations:
-        if location.lon is None or location.lat is None:
-            continue
-        coords_by_address[location.address] = (location.lon, location.lat)
-
-    def get_or_fetch_coords(address: str) -> tuple | None:
-        if not address:
-            return None
-        coords = coords_by_address.get(address)
-        if coords is not None:
-            return coords
-        coords = fetch_coordinates(address)
-        if coords is None:
-            return None
-        lon, lat = coords
-        Location.objects.update_or_create(
-            address=address,
-            defaults={'lon': lon, 'lat': lat},
-        )
-        coords_by_address[address] = coords
-        return coords
 
+def attach_available_restaurants(orders):
     for order in orders:
-        order_coords = get_or_fetch_coords(order.address)
+        order.available_restaurants = [
+            (candidate.restaurant, candidate.distance)
+            for candidate in order.ranked_candidates
+        ]
+        order.geocoder_error = order.geocode_status == Order.GEOCODE_FAILED
 
-        if order_coords is None:
-            order.available_restaurants = []
-            order.geocoder_error = True
-            continue
 
-        order_product_ids = {item.product_id for item in order.items.all()}
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    orders = Order.objects.not_finished()
+
+    filter_form = OrderFilterForm(request.GET or None)
+    if filter_form.is_bound and not filter_form.is_valid():
+        # Неотфильтрованный список под видом отфильтрованного только запутает
+        return render(request, 'order_items.html', context={
+            'orders': [],
+            'filter_form': filter_form,
+        }, status=400)
+    if filter_form.is_bound:
+        orders = filter_form.filter_orders(orders)
+
+    feed_cursor = encode_changes_cursor(timezone.now() - ORDERS_FEED_SETTLE_DELAY, 0)
+    feed_params = request.GET.copy()
+    feed_params.pop('cursor', None)
+    cursor = request.GET.get('cursor')
+    try:
+        orders, next_cursor = paginate_orders(
+            with_ranked_candidates(orders),
+            cursor=cursor,
+            page_size=settings.ORDERS_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный курсор')
 
-        candidates = []
+    attach_available_restaurants(orders)
 
-        for restaurant in restaurants:
-            rest_product_ids = {
-                item.product_id for item in restaurant.available_menu_items
-            }
+    next_page_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_page_url = f'?{params.urlencode()}'
 
-            if not order_product_ids.issubset(rest_product_ids):
-                continue
+    first_page_url = None
+    if cursor:
+        params = request.GET.copy()
+        del params['cursor']
+        first_page_url = f'?{params.urlencode()}'
 
-            rest_coords = get_or_fetch_coords(restaurant.address)
-            if rest_coords is None:
-                continue
+    return render(request, 'order_items.html', context={
+        'orders': orders,
+        'filter_form': filter_form,
+        'next_page_url': next_page_url,
+        'first_page_url': first_page_url,
+        'feed_cursor': feed_cursor,
+        'feed_query': feed_params.urlencode(),
+        'dashboard_generation': get_generation('dashboard'),
+    })
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders_changes(request):
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return HttpResponseBadRequest('Не указан курсор')
+
+    try:
+        timeout = float(request.GET.get('timeout', settings.ORDERS_FEED_TIMEOUT))
+    except ValueError:
+        return HttpResponseBadRequest('Некорректный timeout')
+    if not math.isfinite(timeout):
+        return HttpResponseBadRequest('Некорректный timeout')
+    timeout = min(max(timeout, 0), settings.ORDERS_FEED_TIMEOUT)
+
+    filter_form = OrderFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return HttpResponseBadRequest('Некорректный фильтр')
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            changes, cursor = changed_orders(
+                with_ranked_candidates(Order.objects.all()),
+                cursor=cursor,
+                until=timezone.now() - ORDERS_FEED_SETTLE_DELAY,
+                limit=ORDERS_FEED_BATCH_SIZE,
+            )
+        except InvalidCursor:
+            return HttpResponseBadRequest('Некорректный курсор')
+        if changes or time.monotonic() >= deadline:
+            break
+        time.sleep(ORDERS_FEED_POLL_INTERVAL)
+
+    # Заказ, который больше не подходит под фильтры страницы, с неё убирается,
+    # как и завершённый
+    shown_ids = set(
+        filter_form.filter_orders(Order.objects.not_finished())
+        .filter(pk__in=[order.id for order in changes])
+        .values_list('pk', flat=True)
+    )
+    attach_available_restaurants([order for order in changes if order.id in shown_ids])
+    context = {'dashboard_generation': get_generation('dashboard')}
+    return JsonResponse({
+        'cursor': cursor,
+        'orders': [
+            {
+                'id': order.id,
+                'removed': order.id not in shown_ids,
+                'html': render_to_string(
+                    'order_row.html', {**context, 'order': order}, request,
+                ) if order.id in shown_ids else None,
+            }
+            for order in changes
+        ],
+    })
 
-            dist = distance_km(order_coords, rest_coords)
-            candidates.append((restaurant, dist))
 
-        candidates.sort(key=lambda pair: pair[1])
+def orders_etag():
+    versions = Order.objects.not_finished().aggregate(
+        last_updated_at=Max('updated_at'),
+        orders_count=Count('id'),
+    )
+    last_updated_at = versions['last_updated_at']
+    fingerprint = ':'.join([
+        last_updated_at.isoformat() if last_updated_at else '',
+        str(versions['orders_count']),
+        str(get_generation('dashboard')),
+    ])
+    return '"{}"'.format(hashlib.sha256(fingerprint.encode()).hexdigest())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def orders_api(request):
+    etag = orders_etag()
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    orders = list(
+        with_ranked_candidates(Order.objects.not_finished())
+        .order_by('status_priority', 'registered_at', 'id')
+    )
 
-        order.available_restaurants = candidates
-        order.geocoder_error = False if candidates else True
+    restaurants = {}
+    dumped_orders = []
+    for order in orders:
+        if order.cooking_restaurant:
+            restaurants[order.cooking_restaurant.id] = order.cooking_restaurant.name
+        for candidate in order.ranked_candidates:
+            restaurants[candidate.restaurant.id] = candidate.restaurant.name
+
+        dumped_orders.append({
+            'id': order.id,
+            'status': order.status,
+            'payment_method': order.payment_method,
+            'total_cost': order.total_cost,
+            'address': order.address,
+            'registered_at': order.registered_at,
+            'cooking_restaurant': order.cooking_restaurant_id,
+            'candidates': [
+                [candidate.restaurant_id, round(candidate.distance, 3)]
+                for candidate in order.ranked_candidates
+            ],
+        })
 
-    return render(request, 'order_items.html', context={
-        'orders': orders,
-    })
+    return Response(
+        {
+            'restaurants': restaurants,
+            'orders': dumped_orders,
+        },
+        headers={'ETag': etag},
+    )
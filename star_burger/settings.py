@@ -12,6 +12,30 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 GEOCODE_APIKEY=env('GEOCODE_APIKEY')
+GEOCODER = {
+    'BACKEND': env('GEOCODER_BACKEND', 'locations.backends.YandexGeocoder'),
+    'OPTIONS': env.json('GEOCODER_OPTIONS', {}),
+}
+GEOCODE_CIRCUIT_FAILURE_THRESHOLD = env.int('GEOCODE_CIRCUIT_FAILURE_THRESHOLD', 5)
+GEOCODE_CIRCUIT_RECOVERY_TIMEOUT = env.float('GEOCODE_CIRCUIT_RECOVERY_TIMEOUT', 30)
+GEOCODE_MAX_WORKERS = env.int('GEOCODE_MAX_WORKERS', 4)
+GEOCODE_REQUESTS_PER_SECOND = env.float('GEOCODE_REQUESTS_PER_SECOND', 10)
+GEOCODE_RETRY_BASE_DELAY = env.int('GEOCODE_RETRY_BASE_DELAY', 60 * 60)
+GEOCODE_RETRY_MAX_DELAY = env.int('GEOCODE_RETRY_MAX_DELAY', 7 * 24 * 60 * 60)
+GEOCODE_CACHE_ALIAS = env('GEOCODE_CACHE_ALIAS', 'default')
+GEOCODE_LOCAL_CACHE_SIZE = env.int('GEOCODE_LOCAL_CACHE_SIZE', 10000)
+GEOCODE_LOCAL_CACHE_TTL = env.int('GEOCODE_LOCAL_CACHE_TTL', 300)
+GEOCODE_SOFT_TTL = env.int('GEOCODE_SOFT_TTL', 30 * 24 * 60 * 60)
+GEOCODE_HARD_TTL = env.int('GEOCODE_HARD_TTL', 180 * 24 * 60 * 60)
+GEOCODE_REFRESH_WORKERS = env.int('GEOCODE_REFRESH_WORKERS', 2)
+DISTANCE_METRIC = env('DISTANCE_METRIC', 'geodesic')
+ORDER_CANDIDATES_LIMIT = env.int('ORDER_CANDIDATES_LIMIT', 5)
+ORDER_GEOCODE_WORKERS = env.int('ORDER_GEOCODE_WORKERS', 2)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+ORDERS_FEED_TIMEOUT = env.float('ORDERS_FEED_TIMEOUT', 25)
+CATALOG_GZIP = env.bool('CATALOG_GZIP', True)
+CATALOG_SNAPSHOTS = env.bool('CATALOG_SNAPSHOTS', False)
+CATALOG_PAGE_SIZE = env.int('CATALOG_PAGE_SIZE', 50)
 SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG', True)
 
@@ -73,11 +97,16 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'foodcartapp.context_processors.catalog_snapshot',
             ],
         },
     },
 ]
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://?max_entries=10000'),
+}
+
 WSGI_APPLICATION = 'star_burger.wsgi.application'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')